@@ -101,6 +101,17 @@ DATABASES = {
     )
 }
 
+# Cache shared by every worker process: response cache versions, view dedup keys, leaderboards
+# and token revocation all rely on it. Point CACHE_URL at Redis in production (redis://host:6379/0).
+# The default database table works everywhere once `manage.py createcachetable` has run, but every
+# cache read and write is then a query: cached pages and view counting are only database-free on Redis.
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='dbcache://django_cache'),
+}
+if CACHES['default']['BACKEND'] != 'django.core.cache.backends.redis.RedisCache':
+    # The default of 300 entries would have per-viewer keys culling cached pages
+    CACHES['default'].setdefault('OPTIONS', {}).setdefault('MAX_ENTRIES', 100000)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -143,6 +154,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "uploads/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "staticfiles/uploads")
 
+# Uploads with identical content share one file, see dashboard.storage
+STORAGES = {
+    "default": {"BACKEND": "dashboard.storage.DeduplicatingStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -155,7 +172,7 @@ REST_FRAMEWORK = {
     
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'knox.auth.TokenAuthentication',
+        'dashboard.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -183,4 +200,48 @@ MPESA_CONSUMER_SECRET = 'LtlKCLYANCRJH8jpW3UID6O0anRzFS9XqfcT2HG3oGehx941c6JE0ix
 MPESA_API_URL = 'https://sandbox.safaricom.co.ke/'
 MPESA_SHORTCODE = '174379'
 MPESA_PASSKEY = 'bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919'
-MPESA_CALLBACK_URL = 'http://127.0.0.1:8000/api/mpesa/callback/'
\ No newline at end of file
+MPESA_CALLBACK_URL = 'http://127.0.0.1:8000/api/mpesa/callback/'
+# Advertisement view counting
+AD_VIEW_FLUSH_INTERVAL = 60  # seconds between batched view count writes
+AD_VIEW_DEDUP_WINDOW = 30 * 60  # seconds a repeat view from the same client is ignored
+
+# Most viewed advertisement boards
+AD_LEADERBOARD_TTL = 10 * 60  # seconds a cached board is kept at most
+
+# Trending advertisements
+AD_TRENDING_HALF_LIFE_HOURS = 6  # a view counts half as much after this many hours
+AD_TRENDING_WINDOW_HOURS = 48  # hourly view buckets older than this are dropped
+AD_TRENDING_CACHE_TTL = 5 * 60  # seconds trending results are served from cache
+
+# Bulk advertisement import
+AD_IMPORT_MAX_ROWS = 5000  # rows accepted in a single import file
+AD_IMPORT_MAX_PHOTOS = 1000  # files accepted in a single photos archive
+AD_IMPORT_MAX_PHOTO_SIZE = 10 * 1024 * 1024  # uncompressed bytes per photo in the archive
+
+# Advertisement photo renditions
+AD_PHOTO_RENDITION_WORKERS = 2  # processes resizing uploaded photos
+AD_PHOTO_RENDITIONS_ASYNC = True  # render in the worker pool instead of the request thread
+
+# Upload limits for ad photos and mail attachments, checked while the body streams in
+UPLOAD_MAX_FILE_SIZE = 10 * 1024 * 1024  # bytes per file
+UPLOAD_MAX_FILES = 10  # files per request
+UPLOAD_MAX_REQUEST_SIZE = 50 * 1024 * 1024  # bytes per request body
+
+# Cached public list responses
+RESPONSE_CACHE_TTL = 5 * 60  # seconds a cached ad or category list page is kept
+
+# Featured advertisements
+AD_FEATURED_SLOTS = (0, 5, 10)  # first-page feed positions given to featured ads
+
+# Near-duplicate advertisement detection
+AD_DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity of title and description shingles
+
+# Similar advertisement recommendations
+AD_SIMILAR_INDEX_PATH = os.path.join(BASE_DIR, "var", "similar-ads.idx")  # TF-IDF index shared by workers through mmap
+
+# Advertisement lifecycle
+AD_LIFETIME_DAYS = 90  # days after posting that an ad expires and is archived by `manage.py archive_ads`
+
+# Knox token authentication cache, per worker process; revocations reach the other workers through CACHES
+AUTH_TOKEN_CACHE_SIZE = 10000  # validated tokens kept, least recently used dropped first
+AUTH_TOKEN_CACHE_TTL = 60  # seconds a validated token is trusted before it is checked again
@@ -7,6 +7,7 @@ pip install -r requirements.txt
 # Run migrations
 python3 manage.py makemigrations
 python3 manage.py migrate
+python3 manage.py createcachetable
 
 # Seed Database
 python3 manage.py loaddata superusers.json
@@ -0,0 +1,120 @@
+import threading
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import featured, leaderboards, response_cache, search
+from .models import (
+    Advertisement, AdvertisementPhoto, ArchivedAdvertisement, ArchivedAdvertisementPhoto, FeaturedAdvertisement,
+    Reviews,
+)
+
+COPIED_FIELDS = (
+    "id", "user_id", "category_id", "title", "description", "county", "sub_county", "geo_location",
+    "latitude", "longitude", "views", "created_on", "updated_on", "expires_on", "rating_count", "rating_sum",
+)
+
+_state = threading.local()
+
+
+def expired(now=None):
+    """Advertisements past their expiry date. Ads that are featured right now stay until their subscription ends."""
+    return Advertisement.objects.filter(expires_on__lt=now or timezone.now()).exclude(pk__in=featured.featured_ids())
+
+
+def archive(ids):
+    """
+    Move advertisements and their photos into the archive tables in one transaction.
+    Photo rows keep their ids, files and renditions; reviews and featured history are kept on
+    the archived ad as JSON. Returns the number of advertisements archived.
+    """
+    with transaction.atomic():
+        ads = list(
+            Advertisement.objects.filter(pk__in=ids).select_related("category")
+            .only(*COPIED_FIELDS, "category__classification")
+        )
+        if not ads:
+            return 0
+        ids = [ad.pk for ad in ads]
+
+        reviews = {}
+        for ad_id, message, rating, created_on in Reviews.objects.filter(advertisement_id__in=ids).order_by("id").values_list(
+            "advertisement_id", "message", "rating", "created_on"
+        ):
+            reviews.setdefault(ad_id, []).append(
+                {"message": message, "rating": rating, "created_on": created_on.isoformat()}
+            )
+
+        featured_history = {}
+        for ad_id, subscription_id, start_date, end_date in (
+            FeaturedAdvertisement.objects.filter(advertisement_id__in=ids).order_by("subscription__start_date")
+            .values_list("advertisement_id", "subscription_id", "subscription__start_date", "subscription__end_date")
+        ):
+            featured_history.setdefault(ad_id, []).append(
+                {"subscription": str(subscription_id), "start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+            )
+
+        ArchivedAdvertisement.objects.bulk_create([
+            ArchivedAdvertisement(
+                **{field: getattr(ad, field) for field in COPIED_FIELDS},
+                reviews=reviews.get(ad.pk, []), featured=featured_history.get(ad.pk, []),
+            )
+            for ad in ads
+        ])
+        ArchivedAdvertisementPhoto.objects.bulk_create([
+            ArchivedAdvertisementPhoto(id=photo.pk, advert_id=photo.advert_id, photo=photo.photo.name,
+                                       renditions=photo.renditions)
+            for photo in AdvertisementPhoto.objects.filter(advert_id__in=ids)
+        ])
+
+        # The per-row delete receivers stand down while the cascade runs; their work is done once for the batch.
+        # Photo files, renditions and seller ratings now belong to the archived copies, so they are left alone.
+        _state.archiving = True
+        try:
+            Advertisement.objects.filter(pk__in=ids).delete()
+        finally:
+            _state.archiving = False
+        search.remove_from_search_index_bulk(ids)
+
+        classifications = {ad.category.classification for ad in ads}
+        category_ids = {ad.category_id for ad in ads}
+        transaction.on_commit(lambda: invalidate_caches(classifications, category_ids, bool(featured_history)))
+    return len(ads)
+
+
+def invalidate_caches(classifications, category_ids, had_featured):
+    """Drop what the archived ads were cached in, with a single response cache version bump."""
+    leaderboards.invalidate_scopes(classifications, category_ids)
+    if had_featured:
+        # Also bumps the advertisement responses
+        featured.invalidate()
+    else:
+        response_cache.bump(response_cache.ADVERTISEMENTS)
+
+
+def archive_expired(batch_size=500, now=None):
+    """Archive every expired advertisement, batch_size per transaction so locks stay short. Returns the count."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(expired(now).order_by("expires_on").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += archive(ids)
+
+
+def get_archived(pk):
+    """An archived advertisement with its photos, or None."""
+    try:
+        return (
+            ArchivedAdvertisement.objects.select_related("category")
+            .prefetch_related("advertisement_photos").filter(pk=pk).first()
+        )
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+
+def in_progress():
+    """Whether this thread is deleting advertisements that archive() just copied."""
+    return getattr(_state, "archiving", False)
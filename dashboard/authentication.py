@@ -0,0 +1,125 @@
+import binascii
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from rest_framework import exceptions
+
+from . import response_cache
+
+TOKEN_CACHE_SIZE = getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 10000)
+TOKEN_CACHE_TTL = getattr(settings, "AUTH_TOKEN_CACHE_TTL", 60)
+# Backends each process keeps to itself; a revocation stored in one would never reach the other workers
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def user_resource(user_id):
+    return f"auth-user:{user_id}"
+
+
+def revocation_is_shared():
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def revoke_user(user_id):
+    """Invalidate every cached token of a user, in this process and, through the shared version, in all others."""
+    token_cache.discard_user(user_id)
+    response_cache.bump(user_resource(user_id))
+
+
+class TokenCache:
+    """
+    Bounded, thread-safe LRU map of token digest -> validated (user, token).
+    Entries live for at most `ttl` seconds and never past the token's own expiry.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+            return entry
+
+    def set(self, digest, user, auth_token, version):
+        lifetime = self.ttl
+        if auth_token.expiry is not None:
+            lifetime = min(lifetime, (auth_token.expiry - timezone.now()).total_seconds())
+        if lifetime <= 0:
+            return
+        with self.lock:
+            self.entries[digest] = (user, auth_token, version, time.monotonic() + lifetime)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for digest in [digest for digest, entry in self.entries.items() if entry[0].pk == user_id]:
+                del self.entries[digest]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Knox token authentication that remembers validated tokens for a short while.
+
+    A hit costs the token digest and one read of the user's auth version from the shared cache,
+    instead of the AuthToken lookup, digest comparison and user fetch. Logging out, deleting a
+    token or saving the user bumps that version, so no worker keeps honouring a revoked token.
+    With a process-local cache backend there is no such shared version, and every request is
+    checked against the database as plain knox does.
+    """
+
+    def authenticate_credentials(self, token):
+        if not revocation_is_shared():
+            return super().authenticate_credentials(token)
+
+        try:
+            digest = hash_token(token.decode("utf-8"))
+        except (TypeError, UnicodeDecodeError, binascii.Error):
+            raise exceptions.AuthenticationFailed("Invalid token.")
+
+        entry = token_cache.get(digest)
+        if entry is not None:
+            user, auth_token, version, _ = entry
+            if response_cache.versions([user_resource(user.pk)])[0] == version:
+                # Copies, so a view changing request.user cannot leak into other requests
+                return copy.copy(user), copy.copy(auth_token)
+            token_cache.discard(digest)
+
+        user, auth_token = super().authenticate_credentials(token)
+        version = response_cache.versions([user_resource(user.pk)])[0]
+        # A logout or deactivation between the lookup above and reading the version has already bumped it,
+        # so only cache the token if it is still valid under that version
+        if AuthToken.objects.filter(digest=auth_token.digest, user__is_active=True).exists():
+            token_cache.set(digest, user, auth_token, version)
+        return copy.copy(user), copy.copy(auth_token)
@@ -0,0 +1,107 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Advertisement
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def timestamp(value):
+    return int(value.timestamp()) if value is not None else None
+
+
+def media_format(request):
+    renderer = getattr(request, "accepted_renderer", None)
+    return renderer.format if renderer is not None else ""
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """A 304 response when the request's If-None-Match / If-Modified-Since still match, otherwise None."""
+    if etag is None and last_modified is None:
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def advertisement_validators(request, pk):
+    """
+    (ETag, Last-Modified timestamp) of one advertisement from its `updated_on` and photo set,
+    in a single query. Returns (None, None) when the advertisement does not exist.
+    """
+    try:
+        rows = list(
+            Advertisement.objects.filter(pk=pk)
+            .order_by("advertisement_photos__id")
+            .values_list("updated_on", "advertisement_photos__id")
+        )
+    except (TypeError, ValueError, ValidationError):
+        return None, None
+    if not rows:
+        return None, None
+
+    updated_on = rows[0][0]
+    photo_ids = [photo_id for _, photo_id in rows if photo_id is not None]
+    return make_etag(str(pk), updated_on.isoformat(), photo_ids, media_format(request)), timestamp(updated_on)
+
+
+def is_conditional(request):
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+class ConditionalListMixin:
+    """
+    Send ETag and Last-Modified with list pages and answer matching conditional requests with a 304.
+
+    Validators come from the page window itself: the ids and `updated_on` of the rows on the page and
+    whether pages follow or precede it, together with the query params. A 200 derives them from the page
+    it already fetched; only a conditional request fetches the window up front, without photos or
+    serialization, so no request counts or aggregates the whole filtered set.
+    The view count shown in each ad is not part of the validators.
+    """
+    page_window = None
+
+    def get_validator_parts(self):
+        """Extra state the page depends on besides its rows, for views that add to the list."""
+        return ()
+
+    def paginate_queryset(self, queryset):
+        self.page_window = super().paginate_queryset(queryset)
+        return self.page_window
+
+    def get_list_validators(self, request, page):
+        last_modified = max((obj.updated_on for obj in page), default=None)
+        etag = make_etag(
+            request.get_full_path(), media_format(request),
+            [(str(obj.pk), obj.updated_on.isoformat()) for obj in page],
+            self.paginator.get_next_link() is not None, self.paginator.get_previous_link() is not None,
+            *self.get_validator_parts()
+        )
+        return etag, timestamp(last_modified)
+
+    def list(self, request, *args, **kwargs):
+        if is_conditional(request):
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).prefetch_related(None))
+            if page is not None:
+                response = not_modified(request, *self.get_list_validators(request, page))
+                if response is not None:
+                    return response
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and self.page_window is not None:
+            set_validators(response, *self.get_list_validators(request, self.page_window))
+        return response
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Advertisement, AdvertisementFingerprint, AdvertisementLSHBucket
+from .utils import minhash
+
+DUPLICATE_THRESHOLD = getattr(settings, "AD_DUPLICATE_THRESHOLD", 0.8)
+
+
+def document(advertisement):
+    return f"{advertisement.title} {advertisement.description}"
+
+
+def fingerprint_rows(advertisement):
+    sig = minhash.signature(document(advertisement))
+    fingerprint = AdvertisementFingerprint(advertisement_id=advertisement.pk, signature=minhash.to_bytes(sig))
+    buckets = [
+        AdvertisementLSHBucket(advertisement_id=advertisement.pk, band=band, bucket=bucket)
+        for band, bucket in minhash.band_hashes(sig)
+    ]
+    return fingerprint, buckets
+
+
+def index_bulk(advertisements):
+    """Store fingerprints and LSH buckets for many advertisements, replacing any they had."""
+    fingerprints, buckets = [], []
+    for advertisement in advertisements:
+        fingerprint, ad_buckets = fingerprint_rows(advertisement)
+        fingerprints.append(fingerprint)
+        buckets.extend(ad_buckets)
+    if not fingerprints:
+        return
+
+    ids = [fingerprint.advertisement_id for fingerprint in fingerprints]
+    with transaction.atomic():
+        AdvertisementLSHBucket.objects.filter(advertisement_id__in=ids).delete()
+        AdvertisementFingerprint.objects.filter(advertisement_id__in=ids).delete()
+        AdvertisementFingerprint.objects.bulk_create(fingerprints)
+        AdvertisementLSHBucket.objects.bulk_create(buckets)
+
+
+def index(advertisement):
+    index_bulk([advertisement])
+
+
+def candidate_ids(sig, exclude=None):
+    """Ads sharing at least one LSH band with the signature, found through the (band, bucket) index."""
+    match = Q()
+    for band, bucket in minhash.band_hashes(sig):
+        match |= Q(band=band, bucket=bucket)
+    candidates = AdvertisementLSHBucket.objects.filter(match)
+    if exclude is not None:
+        candidates = candidates.exclude(advertisement_id=exclude)
+    return set(candidates.values_list("advertisement_id", flat=True))
+
+
+def find_duplicates(advertisement, threshold=DUPLICATE_THRESHOLD):
+    """[(ad id, estimated similarity)] of likely reposts of an advertisement, most similar first."""
+    sig = minhash.signature(document(advertisement))
+    ids = candidate_ids(sig, exclude=advertisement.pk)
+    if not ids:
+        return []
+
+    matches = []
+    for ad_id, signature in AdvertisementFingerprint.objects.filter(advertisement_id__in=ids).values_list(
+        "advertisement_id", "signature"
+    ):
+        score = minhash.similarity(sig, minhash.from_bytes(signature))
+        if score >= threshold:
+            matches.append((ad_id, score))
+    return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+def duplicate_groups(threshold=DUPLICATE_THRESHOLD):
+    """
+    Groups of near-duplicate advertisement ids across the whole table.
+    Only ads that share a bucket are compared, so the work scales with the number of collisions, not n².
+    """
+    # Rows whose (band, bucket) has another row; a bucket value alone may recur in unrelated bands
+    shared = AdvertisementLSHBucket.objects.filter(
+        band=OuterRef("band"), bucket=OuterRef("bucket")
+    ).exclude(pk=OuterRef("pk"))
+    pairs = set()
+    members = defaultdict(list)
+    for band, bucket, ad_id in AdvertisementLSHBucket.objects.filter(Exists(shared)).values_list(
+        "band", "bucket", "advertisement_id"
+    ):
+        members[(band, bucket)].append(ad_id)
+    for ids in members.values():
+        ids = sorted(set(ids))
+        pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    if not pairs:
+        return []
+
+    signatures = {
+        ad_id: minhash.from_bytes(signature)
+        for ad_id, signature in AdvertisementFingerprint.objects.filter(
+            advertisement_id__in={ad_id for pair in pairs for ad_id in pair}
+        ).values_list("advertisement_id", "signature")
+    }
+
+    # Union-find over the pairs that pass the threshold
+    parent = {}
+
+    def root(ad_id):
+        parent.setdefault(ad_id, ad_id)
+        while parent[ad_id] != ad_id:
+            parent[ad_id] = parent[parent[ad_id]]
+            ad_id = parent[ad_id]
+        return ad_id
+
+    for a, b in pairs:
+        if a in signatures and b in signatures and minhash.similarity(signatures[a], signatures[b]) >= threshold:
+            parent[root(a)] = root(b)
+
+    groups = defaultdict(list)
+    for ad_id in parent:
+        groups[root(ad_id)].append(ad_id)
+    return [sorted(group, key=str) for group in groups.values() if len(group) > 1]
+
+
+def unindexed():
+    return Advertisement.objects.filter(fingerprint__isnull=True)
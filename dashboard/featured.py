@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import response_cache
+from .models import Advertisement, FeaturedAdvertisement
+
+# Positions in the first page of a feed that are given to featured ads
+FEATURED_SLOTS = getattr(settings, "AD_FEATURED_SLOTS", (0, 5, 10))
+ACTIVE_SET_KEY = "featured:active"
+
+
+def active_featured():
+    """Featured advertisements whose subscription is active and has not run out."""
+    return FeaturedAdvertisement.objects.filter(
+        subscription__active=True, subscription__end_date__gte=timezone.localdate()
+    )
+
+
+def rebuild():
+    """
+    Recompute the active set in one query: featured ad ids per classification, newest subscription first,
+    and the day the set next changes because a subscription runs out.
+    """
+    today = timezone.localdate()
+    by_classification = {}
+    expires = None
+    rows = (
+        active_featured()
+        .order_by("-subscription__start_date", "advertisement_id")
+        .values_list("advertisement_id", "advertisement__category__classification", "subscription__end_date")
+    )
+    for ad_id, classification, end_date in rows:
+        ids = by_classification.setdefault(classification, [])
+        if ad_id not in ids:
+            ids.append(ad_id)
+        expires = min(expires, end_date) if expires else end_date
+
+    active = {
+        "by_classification": by_classification,
+        "ids": {ad_id for ids in by_classification.values() for ad_id in ids},
+        "valid_until": expires or today + timedelta(days=1),
+    }
+    cache.set(ACTIVE_SET_KEY, active, timeout=24 * 60 * 60)
+    return active
+
+
+def get_active_set():
+    active = cache.get(ACTIVE_SET_KEY)
+    if active is None:
+        return rebuild()
+    if timezone.localdate() > active["valid_until"]:
+        # A subscription ran out since the set was built
+        previous = active["ids"]
+        active = rebuild()
+        if active["ids"] != previous:
+            response_cache.bump(response_cache.ADVERTISEMENTS)
+    return active
+
+
+def invalidate():
+    """Drop the active set after subscriptions or featured ads change."""
+    cache.delete(ACTIVE_SET_KEY)
+    response_cache.bump(response_cache.ADVERTISEMENTS)
+
+
+def featured_ids():
+    return get_active_set()["ids"]
+
+
+def is_featured(ad_id):
+    return ad_id in featured_ids()
+
+
+def featured_ad_ids(classification, limit=None):
+    ids = get_active_set()["by_classification"].get(classification, [])
+    return ids[:limit] if limit is not None else ids
+
+
+class FeaturedFeedMixin:
+    """
+    Interleave the classification's featured ads into the first page of a feed at FEATURED_SLOTS,
+    and flag every result with `is_featured`. Membership comes from the cached active set,
+    so organic rows need no join against subscriptions.
+
+    Promoted ads take their slots from the first page's organic rows, so the page keeps its size,
+    and they are left out of the organic rows of every page, so they are not shown twice.
+    """
+    featured_classification = None
+
+    def get_featured_ids(self):
+        return featured_ad_ids(self.featured_classification, len(FEATURED_SLOTS))
+
+    def get_promoted(self):
+        """The featured ads placed on the first page, in slot order; ads deleted since the set was built are skipped."""
+        if not hasattr(self, "_promoted"):
+            ids = self.get_featured_ids()
+            ads = Advertisement.objects.for_listing().in_bulk(ids) if ids else {}
+            self._promoted = [ads[ad_id] for ad_id in ids if ad_id in ads]
+        return self._promoted
+
+    def get_validator_parts(self):
+        # Every featured id, since any of them may be flagged in the page, and the promoted ads shown on top of it
+        return (
+            *super().get_validator_parts(),
+            tuple(str(ad_id) for ad_id in featured_ad_ids(self.featured_classification)),
+            tuple((str(ad.pk), ad.updated_on.isoformat()) for ad in self.get_promoted()),
+        )
+
+    def paginate_queryset(self, queryset):
+        promoted = self.get_promoted()
+        if promoted:
+            queryset = queryset.exclude(pk__in=[ad.pk for ad in promoted])
+            if self.paginator.cursor_query_param not in self.request.query_params:
+                # From the class setting, as a conditional request paginates twice
+                self.paginator.page_size = max(type(self.paginator).page_size - len(promoted), 1)
+        return super().paginate_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        active = {str(ad_id) for ad_id in featured_ids()}
+        results = response.data["results"]
+        for item in results:
+            item["is_featured"] = item["id"] in active
+
+        if self.paginator.cursor_query_param in request.query_params:
+            return response
+
+        promoted_data = self.get_serializer(self.get_promoted(), many=True).data
+        for item in promoted_data:
+            item["is_featured"] = True
+        for slot, item in zip(FEATURED_SLOTS, promoted_data):
+            results.insert(min(slot, len(results)), item)
+        return response
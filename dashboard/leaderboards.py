@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Advertisement
+
+LEADERBOARD_SIZE = getattr(settings, "AD_LEADERBOARD_SIZE", 10)
+# Upper bound on how stale a board can get if an invalidation is missed
+LEADERBOARD_TTL = getattr(settings, "AD_LEADERBOARD_TTL", 10 * 60)
+
+SCOPES = {
+    "classification": "category__classification",
+    "category": "category_id",
+}
+
+
+def cache_key(scope, value):
+    return f"leaderboard:{scope}:{value}"
+
+
+def scope_filter(scope, value):
+    return {SCOPES[scope]: value}
+
+
+def rebuild(scope, value):
+    """Recompute a leaderboard from the (views, id) index and store it in the cache."""
+    entries = list(
+        Advertisement.objects.filter(**scope_filter(scope, value))
+        .order_by("-views", "-id")
+        .values_list("views", "id")[:LEADERBOARD_SIZE]
+    )
+    cache.set(cache_key(scope, value), entries, timeout=LEADERBOARD_TTL)
+    return entries
+
+
+def get_entries(scope, value):
+    entries = cache.get(cache_key(scope, value))
+    if entries is None:
+        entries = rebuild(scope, value)
+    return entries
+
+
+def top_ads(scope, value, queryset=None):
+    """
+    Return the most viewed advertisements in a classification or category, most viewed first.
+
+    The ranking comes from the cache; only the advertisements themselves are loaded. If any of
+    them were deleted or moved out of scope since the board was built, it is rebuilt once.
+    """
+    queryset = queryset if queryset is not None else Advertisement.objects.all()
+    queryset = queryset.filter(**scope_filter(scope, value))
+
+    for _attempt in range(2):
+        ids = [ad_id for _, ad_id in get_entries(scope, value)]
+        ads = {ad.pk: ad for ad in queryset.filter(pk__in=ids)}
+        if len(ads) == len(ids):
+            break
+        cache.delete(cache_key(scope, value))
+
+    return [ads[ad_id] for ad_id in ids if ad_id in ads]
+
+
+def reorders(entries, ad_id, views):
+    """Whether an advertisement with these views changes a board: it is on it, or now ranks above its last entry."""
+    if len(entries) < LEADERBOARD_SIZE or any(entry_id == ad_id for _, entry_id in entries):
+        return True
+    return (views, ad_id) > tuple(entries[-1])
+
+
+def apply_view_deltas(deltas):
+    """
+    Drop the cached leaderboards that freshly flushed view counts reorder; the next read rebuilds them.
+
+    Views only grow, so an advertisement only affects a board it is on or whose last entry it passes.
+    Deleting is idempotent, so flushes running at once in several workers cannot overwrite each
+    other the way a read-modify-write of the board would.
+    """
+    if not deltas:
+        return
+
+    rows = list(Advertisement.objects.filter(pk__in=list(deltas)).values_list(
+        "id", "views", "category_id", "category__classification"
+    ))
+    scoped = [
+        (cache_key(scope, value), ad_id, views)
+        for ad_id, views, category_id, classification in rows
+        for scope, value in (("classification", classification), ("category", category_id))
+    ]
+    boards = cache.get_many({key for key, _, _ in scoped})
+    stale = {key for key, ad_id, views in scoped if key in boards and reorders(boards[key], ad_id, views)}
+    if stale:
+        cache.delete_many(stale)
+
+
+def invalidate(advertisement):
+    """Drop the boards an advertisement belongs to after it is created, edited or deleted."""
+    cache.delete_many([
+        cache_key("classification", advertisement.category.classification),
+        cache_key("category", advertisement.category_id),
+    ])
+
+
+def invalidate_scopes(classifications=(), category_ids=()):
+    """Drop several boards at once, e.g. after advertisements were bulk created."""
+    cache.delete_many(
+        [cache_key("classification", value) for value in classifications]
+        + [cache_key("category", value) for value in category_ids]
+    )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import archive
+
+
+class Command(BaseCommand):
+    help = "Move expired advertisements and their photos to the archive tables, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Advertisements moved per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the advertisements due for archival.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            self.stdout.write(f"{archive.expired().count()} advertisements are due for archival.")
+            return
+        archived = archive.archive_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} advertisements."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.models import Advertisement
+
+
+class Command(BaseCommand):
+    help = "Parse latitude and longitude from the maps URI of existing advertisements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows written per UPDATE batch.")
+        parser.add_argument("--all", action="store_true", help="Re-parse ads that already have coordinates.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        queryset = Advertisement.objects.exclude(geo_location="").only("id", "geo_location", "latitude", "longitude")
+        if not options["all"]:
+            queryset = queryset.filter(latitude__isnull=True)
+
+        batch = []
+        parsed = 0
+        for ad in queryset.iterator(chunk_size=batch_size):
+            ad.update_coordinates()
+            if ad.latitude is not None:
+                parsed += 1
+            batch.append(ad)
+            if len(batch) >= batch_size:
+                Advertisement.objects.bulk_update(batch, ["latitude", "longitude"])
+                batch = []
+
+        if batch:
+            Advertisement.objects.bulk_update(batch, ["latitude", "longitude"])
+
+        self.stdout.write(self.style.SUCCESS(f"Parsed coordinates for {parsed} advertisements."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import similar
+
+
+class Command(BaseCommand):
+    help = "Rebuild the TF-IDF index behind similar-ad recommendations. Run it periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=similar.INDEX_PATH, help="Where to write the index file.")
+
+    def handle(self, *args, **options):
+        total = similar.build(options["path"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} advertisements into {options['path']}."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard import featured
+from dashboard.models import Subscription
+
+
+class Command(BaseCommand):
+    help = "Deactivate subscriptions past their end date and rebuild the featured advertisement set."
+
+    def handle(self, *args, **options):
+        expired = Subscription.objects.filter(active=True, end_date__lt=timezone.localdate()).update(active=False)
+        # update() sends no signals
+        featured.invalidate()
+        featured.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Deactivated {expired} subscriptions."))
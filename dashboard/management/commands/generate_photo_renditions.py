@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.models import AdvertisementPhoto
+from dashboard.utils import renditions
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail, medium and WebP renditions for existing advertisement photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate photos that already have renditions.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Photos fetched per query.")
+
+    def handle(self, *args, **options):
+        queryset = AdvertisementPhoto.objects.only("id", "photo", "renditions").order_by("id")
+        if not options["all"]:
+            queryset = queryset.filter(renditions={})
+
+        rendered, failed = renditions.generate_many(queryset.iterator(chunk_size=options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} photos, {failed} failed."))
@@ -0,0 +1,40 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.utils.bulk_import import AdvertisementImporter, BulkImportError
+
+
+class Command(BaseCommand):
+    help = "Bulk import advertisements for a user from a CSV or JSON file, with an optional zip of photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file with one advertisement per row.")
+        parser.add_argument("--user", required=True, help="Email of the user the advertisements belong to.")
+        parser.add_argument("--photos", help="Zip archive holding the photos named in the rows.")
+        parser.add_argument("--format", choices=["csv", "json"], help="Defaults to the file extension.")
+        parser.add_argument("--partial", action="store_true", help="Insert valid rows even if some rows fail.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows per bulk INSERT.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+
+        importer = AdvertisementImporter(user, chunk_size=options["chunk_size"])
+        photos = open(options["photos"], "rb") if options["photos"] else None
+        try:
+            with open(options["path"], "rb") as data_file:
+                report = importer.run(data_file, photos, options["format"], allow_partial=options["partial"])
+        except BulkImportError as e:
+            raise CommandError(str(e))
+        finally:
+            if photos:
+                photos.close()
+
+        for error in report["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(f"Created {report['created']} of {report['total']} advertisements."))
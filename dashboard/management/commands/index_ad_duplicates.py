@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import duplicates
+from dashboard.models import Advertisement
+
+
+class Command(BaseCommand):
+    help = "Compute MinHash fingerprints for advertisements and report groups of near-duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Advertisements fingerprinted per write.")
+        parser.add_argument("--all", action="store_true", help="Re-fingerprint ads that already have one.")
+        parser.add_argument("--report", action="store_true", help="List groups of near-duplicate ads afterwards.")
+        parser.add_argument("--threshold", type=float, default=duplicates.DUPLICATE_THRESHOLD,
+                            help="Estimated similarity at which two ads count as duplicates.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        queryset = Advertisement.objects.all() if options["all"] else duplicates.unindexed()
+        queryset = queryset.only("id", "title", "description").order_by()
+
+        batch = []
+        indexed = 0
+        for ad in queryset.iterator(chunk_size=batch_size):
+            batch.append(ad)
+            if len(batch) >= batch_size:
+                duplicates.index_bulk(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            duplicates.index_bulk(batch)
+            indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Fingerprinted {indexed} advertisements."))
+
+        if options["report"]:
+            groups = duplicates.duplicate_groups(options["threshold"])
+            titles = dict(Advertisement.objects.filter(
+                pk__in=[ad_id for group in groups for ad_id in group]
+            ).values_list("id", "title"))
+            for group in groups:
+                self.stdout.write(", ".join(f"{ad_id} ({titles.get(ad_id, '?')})" for ad_id in group))
+            self.stdout.write(f"{len(groups)} groups of near-duplicate advertisements.")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import ratings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the rating count, total and histogram stored on each advertisement from its reviews, "
+        "then each seller's reputation from their advertisements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Advertisements checked per query.")
+
+    def handle(self, *args, **options):
+        fixed = ratings.recompute(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Fixed rating aggregates on {fixed} advertisements."))
+        sellers = ratings.recompute_sellers(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Fixed the reputation of {sellers} sellers."))
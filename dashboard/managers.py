@@ -1,4 +1,6 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models import Count
 
 class CustomUserManager(BaseUserManager):
         
@@ -42,3 +44,50 @@ class CustomUserManager(BaseUserManager):
         
         return user
 
+
+class AdvertisementQuerySet(models.QuerySet):
+
+    def by_classification(self, classification):
+        """ Filter advertisements by the classification of their category."""
+        return self.filter(category__classification=classification)
+
+    def for_listing(self):
+        """ Load the relations the advertisement serializers read, so a page costs a fixed number of queries."""
+        return self.select_related("category").prefetch_related("advertisement_photos")
+
+    def facet_counts(self, names=None):
+        """
+        Count matching advertisements per county, sub-county, category and classification in one grouped query.
+        `names` limits the result to some of those facets.
+        """
+        rows = self.order_by().values(
+            "county", "sub_county", "category", "category__name", "category__classification"
+        ).annotate(count=Count("id"))
+
+        facets = {"county": {}, "sub_county": {}, "category": {}, "classification": {}}
+        for row in rows:
+            keys = {
+                "county": (row["county"],),
+                "sub_county": (row["sub_county"], row["county"]),
+                "category": (row["category"], row["category__name"]),
+                "classification": (row["category__classification"],),
+            }
+            for facet, key in keys.items():
+                facets[facet][key] = facets[facet].get(key, 0) + row["count"]
+
+        counts = {
+            "county": [{"value": county, "count": count} for (county,), count in facets["county"].items()],
+            "sub_county": [
+                {"value": sub_county, "county": county, "count": count}
+                for (sub_county, county), count in facets["sub_county"].items()
+            ],
+            "category": [
+                {"value": category, "name": name, "count": count}
+                for (category, name), count in facets["category"].items()
+            ],
+            "classification": [
+                {"value": classification, "count": count}
+                for (classification,), count in facets["classification"].items()
+            ],
+        }
+        return counts if names is None else {name: counts[name] for name in names}
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['-created_on', '-id'], name='ad_created_on_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['-views', '-id'], name='ad_views_id_idx'),
+        ),
+    ]
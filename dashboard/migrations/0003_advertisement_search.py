@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:37
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX ad_search_vector_gin ON dashboard_advertisement USING gin (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE dashboard_advertisement SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS dashboard_advertisement_fts "
+            "USING fts5(ad_id UNINDEXED, title, description)"
+        )
+        schema_editor.execute(
+            "INSERT INTO dashboard_advertisement_fts (ad_id, title, description) "
+            "SELECT id, title, description FROM dashboard_advertisement"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS ad_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS dashboard_advertisement_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_advertisement_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
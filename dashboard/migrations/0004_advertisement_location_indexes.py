@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_advertisement_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['county', 'sub_county'], name='ad_county_sub_county_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['sub_county'], name='ad_sub_county_idx'),
+        ),
+    ]
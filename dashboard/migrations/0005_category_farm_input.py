@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_advertisement_location_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='classification',
+            field=models.CharField(choices=[('FP', 'Farm Produce/Products'), ('FI', 'Farm Input'), ('SL', 'Service Listing')], default='FP', max_length=2, verbose_name='Classification'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_category_farm_input'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertisementViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Views')),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='dashboard.advertisement')),
+            ],
+            options={
+                'verbose_name': 'Advertisement View Bucket',
+                'verbose_name_plural': 'Advertisement View Buckets',
+                'indexes': [models.Index(fields=['hour'], name='ad_view_bucket_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='advertisementviewbucket',
+            constraint=models.UniqueConstraint(fields=('advertisement', 'hour'), name='unique_ad_view_bucket'),
+        ),
+    ]
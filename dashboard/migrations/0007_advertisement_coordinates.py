@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_advertisement_view_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Latitude'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Longitude'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['latitude', 'longitude'], name='ad_lat_lng_idx'),
+        ),
+    ]
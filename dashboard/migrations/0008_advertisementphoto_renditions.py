@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_advertisement_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisementphoto',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Renditions'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-19 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertisementFingerprint',
+            fields=[
+                ('advertisement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='dashboard.advertisement')),
+                ('signature', models.BinaryField(verbose_name='MinHash Signature')),
+            ],
+            options={
+                'verbose_name': 'Advertisement Fingerprint',
+                'verbose_name_plural': 'Advertisement Fingerprints',
+            },
+        ),
+        migrations.CreateModel(
+            name='AdvertisementLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Band')),
+                ('bucket', models.BigIntegerField(verbose_name='Bucket')),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='dashboard.advertisement')),
+            ],
+            options={
+                'verbose_name': 'Advertisement LSH Bucket',
+                'verbose_name_plural': 'Advertisement LSH Buckets',
+                'indexes': [models.Index(fields=['band', 'bucket'], name='ad_lsh_band_bucket_idx')],
+            },
+        ),
+    ]
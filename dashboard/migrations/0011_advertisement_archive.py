@@ -0,0 +1,85 @@
+# Generated by Django 5.0.4 on 2026-10-19 03:15
+
+import dashboard.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from datetime import timedelta
+
+
+def backfill_expiry(apps, schema_editor):
+    # Existing listings expire a full lifetime after they were posted, not after the migration ran
+    Advertisement = apps.get_model("dashboard", "Advertisement")
+    lifetime = timedelta(days=getattr(settings, "AD_LIFETIME_DAYS", 90))
+    Advertisement.objects.update(expires_on=models.F("created_on") + lifetime)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_advertisement_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAdvertisement',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=100, verbose_name='Title')),
+                ('description', models.TextField(verbose_name='Description')),
+                ('county', models.CharField(max_length=50, verbose_name='County')),
+                ('sub_county', models.CharField(max_length=50, verbose_name='Sub County')),
+                ('geo_location', models.URLField(blank=True, max_length=1000, verbose_name='Maps URI')),
+                ('latitude', models.FloatField(blank=True, null=True, verbose_name='Latitude')),
+                ('longitude', models.FloatField(blank=True, null=True, verbose_name='Longitude')),
+                ('views', models.IntegerField(default=0, verbose_name='Views')),
+                ('created_on', models.DateTimeField()),
+                ('updated_on', models.DateTimeField()),
+                ('expires_on', models.DateTimeField(blank=True, null=True, verbose_name='Expired On')),
+                ('archived_on', models.DateTimeField(auto_now_add=True)),
+                ('reviews', models.JSONField(blank=True, default=list, verbose_name='Reviews')),
+            ],
+            options={
+                'verbose_name': 'Archived Advertisement',
+                'verbose_name_plural': 'Archived Advertisements',
+                'ordering': ['-created_on'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAdvertisementPhoto',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('photo', models.ImageField(upload_to='ad-images/', verbose_name='Photo')),
+                ('renditions', models.JSONField(blank=True, default=dict, verbose_name='Renditions')),
+            ],
+            options={
+                'verbose_name': 'Archived Advertisement Photo',
+                'verbose_name_plural': 'Archived Advertisement Photos',
+            },
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='expires_on',
+            field=models.DateTimeField(blank=True, default=dashboard.models.advertisement_expiry, null=True, verbose_name='Expires On'),
+        ),
+        migrations.RunPython(backfill_expiry, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['expires_on'], name='ad_expires_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedadvertisement',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='archived_advertisements', to='dashboard.category'),
+        ),
+        migrations.AddField(
+            model_name='archivedadvertisement',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_advertisements', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedadvertisementphoto',
+            name='advert',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='advertisement_photos', to='dashboard.archivedadvertisement'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.4 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    Advertisement = apps.get_model("dashboard", "Advertisement")
+    Reviews = apps.get_model("dashboard", "Reviews")
+    totals = {}
+    for ad_id, rating, count in Reviews.objects.order_by().values_list("advertisement_id", "rating").annotate(
+        count=models.Count("id")
+    ):
+        fields = totals.setdefault(ad_id, {"rating_count": 0, "rating_sum": 0})
+        fields["rating_count"] += count
+        fields["rating_sum"] += rating * count
+        fields[f"rating_{rating}_count"] = count
+    for ad_id, fields in totals.items():
+        Advertisement.objects.filter(pk=ad_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_advertisement_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='1 Star Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='2 Star Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='3 Star Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='4 Star Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='5 Star Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ratings'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating Total'),
+        ),
+        migrations.AlterField(
+            model_name='reviews',
+            name='rating',
+            field=models.PositiveSmallIntegerField(choices=[(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')], default=1, verbose_name='Rating'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
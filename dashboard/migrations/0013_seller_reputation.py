@@ -0,0 +1,56 @@
+# Generated by Django 5.0.4 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+def backfill_reputation(apps, schema_editor):
+    Advertisement = apps.get_model("dashboard", "Advertisement")
+    ArchivedAdvertisement = apps.get_model("dashboard", "ArchivedAdvertisement")
+    CustomUser = apps.get_model("dashboard", "CustomUser")
+
+    for archived in ArchivedAdvertisement.objects.exclude(reviews=[]):
+        archived.rating_count = len(archived.reviews)
+        archived.rating_sum = sum(int(review["rating"]) for review in archived.reviews)
+        archived.save(update_fields=["rating_count", "rating_sum"])
+
+    totals = {}
+    for model in (Advertisement, ArchivedAdvertisement):
+        for user_id, count, total in model.objects.order_by().values_list("user_id").annotate(
+            count=models.Sum("rating_count"), total=models.Sum("rating_sum")
+        ):
+            user_totals = totals.setdefault(user_id, [0, 0])
+            user_totals[0] += count or 0
+            user_totals[1] += total or 0
+    for user_id, (count, total) in totals.items():
+        CustomUser.objects.filter(pk=user_id).update(review_count=count, rating_sum=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_advertisement_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedadvertisement',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ratings'),
+        ),
+        migrations.AddField(
+            model_name='archivedadvertisement',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Rating Total'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating Total'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Reviews Received'),
+        ),
+        migrations.RunPython(backfill_reputation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-19 03:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_seller_reputation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviews',
+            name='created_on',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created On'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='reviews',
+            index=models.Index(fields=['advertisement', '-created_on', '-id'], name='review_ad_created_on_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviews',
+            index=models.Index(fields=['advertisement', 'rating', '-created_on', '-id'], name='review_ad_rating_created_idx'),
+        ),
+    ]
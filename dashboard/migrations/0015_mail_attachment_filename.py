@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_review_created_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailattachment',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255, verbose_name='File Name'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_mail_attachment_filename'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedadvertisement',
+            name='featured',
+            field=models.JSONField(blank=True, default=list, verbose_name='Featured'),
+        ),
+    ]
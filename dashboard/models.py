@@ -2,6 +2,7 @@
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib import admin
 from django.db import models
@@ -12,10 +13,13 @@ from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import strip_tags
+from django.utils import timezone
 
 from datetime import datetime, timedelta
 from dashboard import managers
+from dashboard.utils.geo import parse_coordinates
 
+import os
 import uuid
 import random
 import string
@@ -36,6 +40,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(_("Active"), default=True)
     is_staff = models.BooleanField(_("Staff"), default=False)
     is_superuser = models.BooleanField(_("Admin"), default=False)
+
+    # Seller reputation over the reviews of every ad they own, live or archived; maintained by dashboard.ratings
+    review_count = models.PositiveIntegerField(_("Reviews Received"), default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(_("Rating Total"), default=0, editable=False)
     
     objects = managers.CustomUserManager()
         
@@ -56,6 +64,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def is_new(self):
         now = datetime.now().astimezone()
         return now - timedelta(days=7) <= self.created_on <= now
+
+    @property
+    def rating_average(self):
+        return round(self.rating_sum / self.review_count, 2) if self.review_count else None
     
     def get_full_name(self):
         return f"{str.capitalize(self.first_name)} {str.capitalize(self.last_name)}"
@@ -76,7 +88,7 @@ class Category(models.Model):
     
     class ADVERT_CLASSIFICATION(models.TextChoices):
         FARM_PRODUCE = "FP", _("Farm Produce/Products")
-        #FARM_INPUT = "FI", _("Farm Input")
+        FARM_INPUT = "FI", _("Farm Input")
         SERVICE_LISTING = "SL", _("Service Listing")
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, editable=False)
@@ -131,6 +143,10 @@ class CategoryRelation(models.Model):
         ]
     
 # Advertisements
+def advertisement_expiry():
+    "When a new listing goes stale and becomes due for archival."
+    return timezone.now() + timedelta(days=getattr(settings, "AD_LIFETIME_DAYS", 90))
+
 class Advertisement(models.Model):
     id = models.UUIDField(primary_key=True, unique=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(CustomUser, related_name="advertisements", on_delete=models.CASCADE)
@@ -143,10 +159,28 @@ class Advertisement(models.Model):
     county = models.CharField(_("County"), max_length=50, null=False, blank=False)
     sub_county = models.CharField(_("Sub County"), max_length=50, null=False, blank=False)
     geo_location = models.URLField(_("Maps URI"), max_length=1000, blank=True)
+    latitude = models.FloatField(_("Latitude"), null=True, blank=True, editable=False)
+    longitude = models.FloatField(_("Longitude"), null=True, blank=True, editable=False)
 
     views = models.IntegerField(_("Views"), default=0)
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
+    # Review aggregates, maintained by dashboard.ratings
+    rating_count = models.PositiveIntegerField(_("Ratings"), default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(_("Rating Total"), default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(_("1 Star Ratings"), default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(_("2 Star Ratings"), default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(_("3 Star Ratings"), default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(_("4 Star Ratings"), default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(_("5 Star Ratings"), default=0, editable=False)
+
+    # Moved to ArchivedAdvertisement by dashboard.archive once passed; never when null
+    expires_on = models.DateTimeField(_("Expires On"), default=advertisement_expiry, null=True, blank=True)
+
+    # Full-text search document, maintained by dashboard.search (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = managers.AdvertisementQuerySet.as_manager()
 
     @admin.display(
         boolean=True,
@@ -161,20 +195,145 @@ class Advertisement(models.Model):
     def __str__(self):
         return F"{self.title} - {self.category.__str__}"
 
+    @property
+    def rating_average(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        return {str(rating): getattr(self, f"rating_{rating}_count") for rating in range(1, 6)}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The owner as loaded, so a save that hands the ad to another seller can move its ratings along
+        instance._loaded_user_id = instance.__dict__.get("user_id")
+        return instance
+
+    def update_coordinates(self):
+        "Parse latitude and longitude out of the maps URI."
+        self.latitude, self.longitude = parse_coordinates(self.geo_location) or (None, None)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "geo_location" in update_fields:
+            self.update_coordinates()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Advertisements"
         verbose_name = "Advertisement"
         ordering = ["-created_on"]
+        indexes = [
+            # Keyset pagination for the recent and popular feeds
+            models.Index(fields=["-created_on", "-id"], name="ad_created_on_id_idx"),
+            models.Index(fields=["-views", "-id"], name="ad_views_id_idx"),
+            # Faceted filtering by location
+            models.Index(fields=["county", "sub_county"], name="ad_county_sub_county_idx"),
+            models.Index(fields=["sub_county"], name="ad_sub_county_idx"),
+            # Bounding-box prefilter for proximity search
+            models.Index(fields=["latitude", "longitude"], name="ad_lat_lng_idx"),
+            # Archival sweep
+            models.Index(fields=["expires_on"], name="ad_expires_on_idx"),
+        ]
 
 class AdvertisementPhoto(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True, editable=False)
     advert = models.ForeignKey(Advertisement, related_name="advertisement_photos", on_delete=models.CASCADE)
     photo = models.ImageField(_("Photo"), upload_to="ad-images/")
+    # rendition name -> storage path, filled in by the background renderer
+    renditions = models.JSONField(_("Renditions"), default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Advertisement Photo"
         verbose_name_plural = "Advertisement Photos"
 
+class AdvertisementViewBucket(models.Model):
+    """Views an advertisement received in one hour, kept for the trending window."""
+    advertisement = models.ForeignKey(Advertisement, related_name="view_buckets", on_delete=models.CASCADE)
+    hour = models.DateTimeField(_("Hour"))
+    views = models.PositiveIntegerField(_("Views"), default=0)
+
+    class Meta:
+        verbose_name = "Advertisement View Bucket"
+        verbose_name_plural = "Advertisement View Buckets"
+        constraints = [
+            models.UniqueConstraint(fields=["advertisement", "hour"], name="unique_ad_view_bucket")
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="ad_view_bucket_hour_idx"),
+        ]
+
+class AdvertisementFingerprint(models.Model):
+    """MinHash signature of an advertisement's title and description, maintained by dashboard.duplicates."""
+    advertisement = models.OneToOneField(Advertisement, primary_key=True, related_name="fingerprint", on_delete=models.CASCADE)
+    signature = models.BinaryField(_("MinHash Signature"))
+
+    class Meta:
+        verbose_name = "Advertisement Fingerprint"
+        verbose_name_plural = "Advertisement Fingerprints"
+
+class AdvertisementLSHBucket(models.Model):
+    """One LSH band of a fingerprint; ads sharing a (band, bucket) are near-duplicate candidates."""
+    advertisement = models.ForeignKey(Advertisement, related_name="lsh_buckets", on_delete=models.CASCADE)
+    band = models.PositiveSmallIntegerField(_("Band"))
+    bucket = models.BigIntegerField(_("Bucket"))
+
+    class Meta:
+        verbose_name = "Advertisement LSH Bucket"
+        verbose_name_plural = "Advertisement LSH Buckets"
+        indexes = [
+            models.Index(fields=["band", "bucket"], name="ad_lsh_band_bucket_idx"),
+        ]
+
+class ArchivedAdvertisement(models.Model):
+    """An expired advertisement moved out of the hot table by dashboard.archive, still readable by id."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(CustomUser, related_name="archived_advertisements", on_delete=models.CASCADE)
+
+    category = models.ForeignKey(Category, related_name="archived_advertisements", on_delete=models.RESTRICT)
+    title = models.CharField(_("Title"), max_length=100)
+    description = models.TextField(_("Description"))
+
+    county = models.CharField(_("County"), max_length=50)
+    sub_county = models.CharField(_("Sub County"), max_length=50)
+    geo_location = models.URLField(_("Maps URI"), max_length=1000, blank=True)
+    latitude = models.FloatField(_("Latitude"), null=True, blank=True)
+    longitude = models.FloatField(_("Longitude"), null=True, blank=True)
+
+    views = models.IntegerField(_("Views"), default=0)
+    created_on = models.DateTimeField()
+    updated_on = models.DateTimeField()
+    expires_on = models.DateTimeField(_("Expired On"), null=True, blank=True)
+    archived_on = models.DateTimeField(auto_now_add=True)
+    # [{"message": ..., "rating": ..., "created_on": ...}] of the reviews the ad had, which are not kept as rows
+    reviews = models.JSONField(_("Reviews"), default=list, blank=True)
+    # [{"subscription": ..., "start_date": ..., "end_date": ...}] of the times the ad was featured
+    featured = models.JSONField(_("Featured"), default=list, blank=True)
+    rating_count = models.PositiveIntegerField(_("Ratings"), default=0)
+    rating_sum = models.PositiveIntegerField(_("Rating Total"), default=0)
+
+    class Meta:
+        verbose_name_plural = "Archived Advertisements"
+        verbose_name = "Archived Advertisement"
+        ordering = ["-created_on"]
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+class ArchivedAdvertisementPhoto(models.Model):
+    """A photo of an archived advertisement; keeps the id, file and renditions of the original row."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    advert = models.ForeignKey(ArchivedAdvertisement, related_name="advertisement_photos", on_delete=models.CASCADE)
+    photo = models.ImageField(_("Photo"), upload_to="ad-images/")
+    renditions = models.JSONField(_("Renditions"), default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "Archived Advertisement Photo"
+        verbose_name_plural = "Archived Advertisement Photos"
+
 class ProduceAdvertisement(Advertisement):
     pass
 
@@ -186,16 +345,24 @@ class ServiceAdvertisement(Advertisement):
 
 # Reviews
 class Reviews(models.Model):
-    class RatingChoices(models.TextChoices):
-        one = "1", _("1 Star")
-        two = "2", _("2 Stars")
-        three = "3", _("3 Stars")
-        four = "4", _("4 Stars")
-        five = "5", _("5 Stars")
+    class RatingChoices(models.IntegerChoices):
+        one = 1, _("1 Star")
+        two = 2, _("2 Stars")
+        three = 3, _("3 Stars")
+        four = 4, _("4 Stars")
+        five = 5, _("5 Stars")
         
     advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE)
     message = models.TextField(_("Review"), blank=True)
-    rating = models.CharField(_("Rating"), max_length=1, choices = RatingChoices.choices, default = RatingChoices.one)    
+    rating = models.PositiveSmallIntegerField(_("Rating"), choices = RatingChoices.choices, default = RatingChoices.one)    
+    created_on = models.DateTimeField(_("Created On"), auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of an advertisement's reviews, unfiltered and by rating
+            models.Index(fields=["advertisement", "-created_on", "-id"], name="review_ad_created_on_id_idx"),
+            models.Index(fields=["advertisement", "rating", "-created_on", "-id"], name="review_ad_rating_created_idx"),
+        ]
 
 # Subscriptions
 class SubscriptionPackage(models.Model):
@@ -325,6 +492,8 @@ class MailAttachment(models.Model):
     object_id = models.UUIDField(default=uuid.uuid4)
     content_object = GenericForeignKey('content_type', 'object_id')
     file = models.FileField(_("File"), upload_to='mail_attachments/')
+    # The stored file is named after its content hash, see dashboard.storage
+    filename = models.CharField(_("File Name"), max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -333,7 +502,27 @@ class MailAttachment(models.Model):
 
     def __str__(self):
         return f"Attachment for {self.content_object}"
+
+    @property
+    def display_name(self):
+        """The name the file was uploaded with; attachments from before it was kept show the stored name."""
+        return self.filename or os.path.basename(self.file.name)
     
+class MediaBlob(models.Model):
+    """One stored file, shared by every upload with the same content."""
+    hash = models.CharField(_("SHA-256"), max_length=64, primary_key=True)
+    name = models.CharField(_("Storage Path"), max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(_("Size"))
+    refcount = models.PositiveIntegerField(_("References"), default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Media Blob")
+        verbose_name_plural = _("Media Blobs")
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
 # User Site visits
 class SiteVisit(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
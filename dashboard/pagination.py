@@ -0,0 +1,162 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a composite ordering such as ("-created_on", "-id").
+
+    The cursor stores the ordering values of the last row of a page, and the next page
+    is fetched with `WHERE (created_on, id) < (...)`. Every page costs the same as the
+    first one and no COUNT query is run. The last ordering field must be unique; other
+    fields may be model fields or numeric annotations such as a search rank.
+    """
+    ordering = ("-created_on", "-id")
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field_names = [field.lstrip("-") for field in self.ordering]
+        self.model = queryset.model
+
+        values, reverse = self.decode_cursor(request)
+        ordering = self.ordering if not reverse else [self.flip(field) for field in self.ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(values, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_values = self.get_values(results[-1]) if results and (has_more or reverse) else None
+        self.previous_values = self.get_values(results[0]) if results and (values is not None and (not reverse or has_more)) else None
+        return results
+
+    def paginate_precomputed(self, results, request, has_more):
+        """Use an already ranked first page (e.g. from a cache) and link on to the keyset pages."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field_names = [field.lstrip("-") for field in self.ordering]
+        self.next_values = self.get_values(results[-1]) if results and has_more else None
+        self.previous_values = None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_values, False))
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_values, True))
+
+    def flip(self, field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def seek_filter(self, values, reverse):
+        """Build `(a, b) < (x, y)` as `a < x OR (a = x AND b < y)`, honouring each field's direction."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_values(self, instance):
+        return [getattr(instance, name) for name in self.field_names]
+
+    def serialize_value(self, value):
+        if isinstance(value, (int, float)):
+            return value
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    def encode_cursor(self, values, reverse):
+        payload = {"v": [self.serialize_value(value) for value in values]}
+        if reverse:
+            payload["r"] = 1
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def parse_value(self, name, value):
+        try:
+            return self.model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            if not isinstance(value, (int, float)):
+                raise ValueError(value)
+            return value
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            raw_values = payload["v"]
+            if len(raw_values) != len(self.field_names):
+                raise ValueError
+            values = [self.parse_value(name, value) for name, value in zip(self.field_names, raw_values)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, bool(payload.get("r"))
+
+
+class RecentAdsPagination(KeysetPagination):
+    """Newest advertisements first, keyed on (created_on, id)."""
+    ordering = ("-created_on", "-id")
+
+
+class PopularAdsPagination(KeysetPagination):
+    """Most viewed advertisements first, keyed on (views, id)."""
+    ordering = ("-views", "-id")
+    page_size = 10
+
+
+class SearchResultsPagination(KeysetPagination):
+    """Best search matches first, keyed on the annotated fixed-precision (rank, id)."""
+    ordering = ("-rank", "-id")
+
+
+class ReviewPagination(KeysetPagination):
+    """Newest reviews of an advertisement first, keyed on (created_on, id)."""
+    ordering = ("-created_on", "-id")
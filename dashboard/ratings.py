@@ -0,0 +1,117 @@
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from . import response_cache
+from .models import Advertisement, ArchivedAdvertisement, CustomUser, Reviews
+
+RATINGS = Reviews.RatingChoices.values
+AGGREGATE_FIELDS = ["rating_count", "rating_sum", *(f"rating_{rating}_count" for rating in RATINGS)]
+
+
+def record(advertisement_id, rating):
+    """Add one rating to an advertisement's aggregates in a single UPDATE, so concurrent reviews never lose a count."""
+    Advertisement.objects.filter(pk=advertisement_id).update(
+        rating_count=F("rating_count") + 1,
+        rating_sum=F("rating_sum") + rating,
+        **{f"rating_{rating}_count": F(f"rating_{rating}_count") + 1},
+        # update() skips auto_now; the ad's validators and cached lists must see the new rating
+        updated_on=timezone.now(),
+    )
+    # The seller is resolved in the same statement, so a concurrent change of owner cannot misdirect the rating
+    CustomUser.objects.filter(advertisements=advertisement_id).update(
+        review_count=F("review_count") + 1, rating_sum=F("rating_sum") + rating
+    )
+    response_cache.bump(response_cache.ADVERTISEMENTS)
+
+
+def adjust_seller(user_id, count, total):
+    """Add (or with negative values, take away) reviews from a seller's reputation."""
+    if user_id is None or not count:
+        return
+    CustomUser.objects.filter(pk=user_id).update(
+        review_count=F("review_count") + count, rating_sum=F("rating_sum") + total
+    )
+
+
+def transfer(advertisement_id, from_user_id, to_user_id):
+    """Move an advertisement's ratings to its new owner's reputation."""
+    row = Advertisement.objects.filter(pk=advertisement_id).values_list("rating_count", "rating_sum").first()
+    if row is None:
+        return
+    count, total = row
+    adjust_seller(from_user_id, -count, -total)
+    adjust_seller(to_user_id, count, total)
+
+
+def aggregates(advertisement_ids):
+    """{ad id: {field: value}} computed from the review rows, zero for ads without reviews."""
+    totals = {ad_id: dict.fromkeys(AGGREGATE_FIELDS, 0) for ad_id in advertisement_ids}
+    for ad_id, rating, count in (
+        Reviews.objects.filter(advertisement_id__in=advertisement_ids)
+        .order_by().values_list("advertisement_id", "rating").annotate(count=Count("id"))
+    ):
+        fields = totals[ad_id]
+        fields["rating_count"] += count
+        fields["rating_sum"] += rating * count
+        fields[f"rating_{rating}_count"] = count
+    return totals
+
+
+def recompute(queryset=None, batch_size=500):
+    """
+    Rebuild the stored aggregates from the review rows, batch_size advertisements at a time.
+    Only ads whose stored values drifted are written. Returns the number of ads fixed.
+    """
+    queryset = (queryset if queryset is not None else Advertisement.objects.all()).order_by().only("id", *AGGREGATE_FIELDS)
+    fixed = 0
+
+    def fix(batch):
+        totals = aggregates([ad.pk for ad in batch])
+        now = timezone.now()
+        drifted = []
+        for ad in batch:
+            fields = totals[ad.pk]
+            if any(getattr(ad, field) != value for field, value in fields.items()):
+                for field, value in fields.items():
+                    setattr(ad, field, value)
+                ad.updated_on = now
+                drifted.append(ad)
+        if drifted:
+            Advertisement.objects.bulk_update(drifted, [*AGGREGATE_FIELDS, "updated_on"])
+        return len(drifted)
+
+    batch = []
+    for ad in queryset.iterator(chunk_size=batch_size):
+        batch.append(ad)
+        if len(batch) >= batch_size:
+            fixed += fix(batch)
+            batch = []
+    if batch:
+        fixed += fix(batch)
+    if fixed:
+        response_cache.bump(response_cache.ADVERTISEMENTS)
+    return fixed
+
+
+def recompute_sellers(batch_size=500):
+    """
+    Rebuild every seller's reputation from the stored aggregates of their live and archived ads,
+    so run it after recompute(). Only sellers whose values drifted are written. Returns the number fixed.
+    """
+    totals = {}
+    for model in (Advertisement, ArchivedAdvertisement):
+        for user_id, count, total in model.objects.order_by().values_list("user_id").annotate(
+            count=Sum("rating_count"), total=Sum("rating_sum")
+        ):
+            user_totals = totals.setdefault(user_id, [0, 0])
+            user_totals[0] += count or 0
+            user_totals[1] += total or 0
+
+    drifted = []
+    for user in CustomUser.objects.order_by().only("id", "review_count", "rating_sum").iterator(chunk_size=batch_size):
+        count, total = totals.get(user.pk, (0, 0))
+        if (user.review_count, user.rating_sum) != (count, total):
+            user.review_count, user.rating_sum = count, total
+            drifted.append(user)
+    CustomUser.objects.bulk_update(drifted, ["review_count", "rating_sum"], batch_size=batch_size)
+    return len(drifted)
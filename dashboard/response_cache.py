@@ -0,0 +1,78 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from . import conditional
+
+RESPONSE_TTL = getattr(settings, "RESPONSE_CACHE_TTL", 5 * 60)
+
+ADVERTISEMENTS = "advertisements"
+CATEGORIES = "categories"
+
+
+def version_key(resource):
+    return f"version:{resource}"
+
+
+def versions(resources):
+    """Current version of each resource. Missing counters restart from the clock so old entries are never reused."""
+    keys = [version_key(resource) for resource in resources]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*resources):
+    """Invalidate every cached response built from these resources."""
+    for resource in resources:
+        try:
+            cache.incr(version_key(resource))
+        except ValueError:
+            versions([resource])
+
+
+def response_key(request, resources):
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    params_hash = hashlib.md5(repr(params).encode()).hexdigest()
+    version_tag = ".".join(str(version) for version in versions(resources))
+    renderer = getattr(request, "accepted_renderer", None)
+    media = renderer.format if renderer is not None else ""
+    return f"response:{request.get_host()}{request.path}:{media}:{version_tag}:{params_hash}"
+
+
+class CachedListMixin:
+    """
+    Serve a list view's response data from the cache.
+
+    Entries are keyed by host, path, query params (page cursor included) and the version
+    of every resource in `cache_resources`. Writes bump those versions instead of deleting
+    entries, so stale pages simply stop being read and expire on their own.
+    Only suitable for responses that are the same for every user.
+    """
+    cache_resources = (ADVERTISEMENTS,)
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        key = response_key(request, self.cache_resources)
+        entry = cache.get(key)
+        if entry is not None:
+            # Validators are kept with the data so a warm conditional request is answered from the cache too
+            data, etag, last_modified = entry
+            response = conditional.not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+            return conditional.set_validators(Response(data), etag, last_modified)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            last_modified = response.get("Last-Modified")
+            entry = (response.data, response.get("ETag"), parse_http_date_safe(last_modified) if last_modified else None)
+            cache.set(key, entry, timeout=self.cache_timeout or RESPONSE_TTL)
+        return response
@@ -0,0 +1,101 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import BigIntegerField, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Round
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "dashboard_advertisement_fts"
+RANK_SCALE = 10 ** 12  # ranks are kept to 12 decimal places; bm25 scores of a small corpus are near 1e-6
+
+
+def is_postgres():
+    return connection.vendor == "postgresql"
+
+
+def search_vector():
+    """Weighted search document for an advertisement: title ranks above description."""
+    return SearchVector("title", weight="A", config=SEARCH_CONFIG) + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+
+
+def fts_query(query):
+    """Turn free text into a safe FTS5 MATCH expression with prefix matching on every term."""
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def update_search_index(advertisement):
+    """Refresh the search document of a single advertisement after it is saved."""
+    update_search_index_bulk([advertisement])
+
+
+def update_search_index_bulk(advertisements):
+    """Refresh the search documents of many advertisements at once, e.g. after bulk_create()."""
+    from .models import Advertisement
+
+    if not advertisements:
+        return
+
+    if is_postgres():
+        Advertisement.objects.filter(pk__in=[ad.pk for ad in advertisements]).update(search_vector=search_vector())
+    elif connection.vendor == "sqlite":
+        rows = [
+            (Advertisement._meta.pk.get_db_prep_value(ad.pk, connection), ad.title, ad.description)
+            for ad in advertisements
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE ad_id = %s", [(row[0],) for row in rows])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (ad_id, title, description) VALUES (%s, %s, %s)", rows)
+
+
+def remove_from_search_index(advertisement):
+    """Drop a deleted advertisement from the SQLite index; PostgreSQL keeps the vector on the row."""
+    remove_from_search_index_bulk([advertisement.pk])
+
+
+def remove_from_search_index_bulk(advertisement_ids):
+    """Drop many deleted advertisements from the SQLite index in one statement, e.g. after archiving them."""
+    from .models import Advertisement
+
+    if connection.vendor == "sqlite" and advertisement_ids:
+        ad_ids = [Advertisement._meta.pk.get_db_prep_value(ad_id, connection) for ad_id in advertisement_ids]
+        placeholders = ", ".join(["%s"] * len(ad_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE ad_id IN ({placeholders})", ad_ids)
+
+
+def fixed_rank(score):
+    """
+    A float relevance score as an exact integer of RANK_SCALE units. Keyset cursors compare ranks
+    for equality, which a float4 ts_rank sent through JSON and back does not reliably survive.
+    """
+    return Cast(Round(score * Value(RANK_SCALE)), BigIntegerField())
+
+
+def search(queryset, query):
+    """
+    Filter advertisements matching the query and annotate each with an integer `rank`, higher is better.
+    """
+    if is_postgres():
+        search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=fixed_rank(SearchRank(F("search_vector"), search_query))
+        )
+
+    match = fts_query(query)
+    if not match:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    # bm25() is lower-is-better, so negate it to share the ordering used on PostgreSQL
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT ad_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    ).annotate(
+        rank=fixed_rank(RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND ad_id = {table}.id",
+            (match,),
+            output_field=FloatField(),
+        ))
+    )
@@ -64,7 +64,14 @@ class CategorySerializer(serializers.ModelSerializer):
         }
 
     def get_sub_categories(self, obj):
-        return CategorySerializer(obj.children.all(), many=True).data
+        # `depth` in the context limits how many levels below this node are expanded
+        depth = self.context.get('depth')
+        if depth is None:
+            return CategorySerializer(obj.children.all(), many=True, context=self.context).data
+        if depth <= 0:
+            return []
+        context = {**self.context, 'depth': depth - 1}
+        return CategorySerializer(obj.children.all(), many=True, context=context).data
 
     def validate(self, data):
         if 'parent' in data:
@@ -73,17 +80,39 @@ class CategorySerializer(serializers.ModelSerializer):
             if self.instance and data['parent'] and self.instance.children.filter(id=data['parent'].id).exists():
                 raise serializers.ValidationError("Cannot set a child category as the parent (circular reference).")
         return data
-       
+
+class CategoryNodeSerializer(serializers.ModelSerializer):
+    """A single level of the category tree, with the number of direct children."""
+    child_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = db.Category
+        fields = ["id", "name", "classification", "image", "parent", "child_count"]
+
 
 # Advertisement Serializers
 class AdvertisementPhotoSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = db.AdvertisementPhoto
-        fields = ['id', 'photo']
+        fields = ['id', 'photo', 'renditions']
         read_only_fields = ['id']
 
+    def get_renditions(self, obj):
+        """URLs of the resized copies that are ready; clients fall back to `photo` for the rest."""
+        request = self.context.get("request")
+        storage = obj.photo.storage
+        urls = {}
+        for name, path in (obj.renditions or {}).items():
+            url = storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
 class AdvertisementSerializer(serializers.ModelSerializer):
     advertisement_photos = AdvertisementPhotoSerializer(many=True, read_only=True)
+    rating_average = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = db.Advertisement
@@ -95,12 +124,18 @@ class AdvertisementSerializer(serializers.ModelSerializer):
             "county",
             "sub_county",
             "geo_location",
+            "latitude",
+            "longitude",
             "views",
             "created_on",
             "updated_on",
+            "expires_on",
+            "rating_count",
+            "rating_average",
+            "rating_histogram",
             "advertisement_photos",
         ]
-        read_only_fields = ["views", "created_on", "updated_on"]
+        read_only_fields = ["views", "created_on", "updated_on", "expires_on"]
 
     def create(self, validated_data):
         user = self.context.get("request").user
@@ -112,21 +147,195 @@ class AdvertisementSerializer(serializers.ModelSerializer):
 
         return advertisement
 
+class ArchivedAdvertisementPhotoSerializer(AdvertisementPhotoSerializer):
+    class Meta(AdvertisementPhotoSerializer.Meta):
+        model = db.ArchivedAdvertisementPhoto
+
+class ArchivedAdvertisementSerializer(serializers.ModelSerializer):
+    """An archived advertisement in the detail shape, flagged with `archived` and read-only."""
+    advertisement_photos = ArchivedAdvertisementPhotoSerializer(many=True, read_only=True)
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = db.ArchivedAdvertisement
+        fields = [
+            "id",
+            "category",
+            "title",
+            "description",
+            "county",
+            "sub_county",
+            "geo_location",
+            "latitude",
+            "longitude",
+            "views",
+            "created_on",
+            "updated_on",
+            "expires_on",
+            "advertisement_photos",
+            "archived",
+            "archived_on",
+            "reviews",
+        ]
+        read_only_fields = fields
+
+    def get_archived(self, obj):
+        return True
+
+class AdvertisementImportRowSerializer(serializers.ModelSerializer):
+    """
+    Validate one row of a bulk import without touching the database.
+    Expects `categories` (id -> Category) and `photo_names` (names in the uploaded archive) in the context.
+    """
+    category = serializers.UUIDField()
+    photos = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+
+    class Meta:
+        model = db.Advertisement
+        fields = ["category", "title", "description", "county", "sub_county", "geo_location", "photos"]
+
+    def to_internal_value(self, data):
+        # CSV cells carry photo names as one string separated by `;`
+        if isinstance(data.get("photos"), str):
+            data = {**data, "photos": [name.strip() for name in data["photos"].split(";") if name.strip()]}
+        return super().to_internal_value(data)
+
+    def validate_category(self, value):
+        category = self.context["categories"].get(value)
+        if category is None:
+            raise serializers.ValidationError("Category does not exist.")
+        return category
+
+    def validate_photos(self, value):
+        missing = [name for name in value if name not in self.context["photo_names"]]
+        if missing:
+            raise serializers.ValidationError(f"Not found in the photos archive: {', '.join(missing)}")
+        return value
+
+class DynamicFieldsMixin:
+    """
+    Let clients shape a payload from the query string: `?fields=id,title` keeps only the named fields,
+    and `?expand=description` adds fields the serializer offers through get_expandable_fields().
+    Fields named in `fields` are expanded as needed, and `id` is always kept.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+
+        def param(name):
+            return [value.strip() for value in request.query_params.get(name, "").split(",") if value.strip()]
+
+        only = param("fields")
+        expandable = self.get_expandable_fields()
+        for name in param("expand") + only:
+            if name in expandable and name not in self.fields:
+                self.fields[name] = expandable[name]
+
+        if only:
+            for name in set(self.fields) - set(only) - {"id"}:
+                self.fields.pop(name)
+
+    def get_expandable_fields(self):
+        return {}
+
+class AdvertisementListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact advertisement card for feeds: title, a location summary and the first photo's thumbnail.
+    `?expand=description,advertisement_photos,...` brings back the fields of the full representation.
+    """
+    location = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    # Stored on the row, so star ratings cost no query per card
+    rating_average = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = db.Advertisement
+        fields = [
+            "id", "category", "title", "location", "county", "sub_county", "views", "created_on", "thumbnail",
+            "rating_count", "rating_average",
+        ]
+
+    def get_expandable_fields(self):
+        return {
+            "description": serializers.CharField(read_only=True),
+            "geo_location": serializers.URLField(read_only=True),
+            "latitude": serializers.FloatField(read_only=True),
+            "longitude": serializers.FloatField(read_only=True),
+            "updated_on": serializers.DateTimeField(read_only=True),
+            "advertisement_photos": AdvertisementPhotoSerializer(many=True, read_only=True),
+            "rating_histogram": serializers.DictField(child=serializers.IntegerField(), read_only=True),
+        }
+
+    def get_location(self, obj):
+        return f"{obj.sub_county}, {obj.county}"
+
+    def get_thumbnail(self, obj):
+        # Uses the prefetched photos, so no query per card
+        photos = obj.advertisement_photos.all()
+        if not photos:
+            return None
+        photo = photos[0]
+        path = (photo.renditions or {}).get("thumbnail") or photo.photo.name
+        url = photo.photo.storage.url(path)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+class SellerProfileSerializer(serializers.ModelSerializer):
+    """Public details of an advertisement's seller"""
+    rating_average = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ["id", "first_name", "last_name", "profile_picture", "created_on", "review_count", "rating_average"]
+
+class AdvertisementFullSerializer(AdvertisementSerializer):
+    """
+    An advertisement with its seller, review summary and featured status.
+    The summary, first page of reviews and featured flag are computed by the view and passed in the context.
+    """
+    seller = SellerProfileSerializer(source="user", read_only=True)
+    reviews = serializers.SerializerMethodField()
+    is_featured = serializers.SerializerMethodField()
+
+    class Meta(AdvertisementSerializer.Meta):
+        fields = AdvertisementSerializer.Meta.fields + ["seller", "reviews", "is_featured"]
+
+    def get_reviews(self, obj):
+        return {
+            **self.context["review_summary"],
+            "next": self.context.get("reviews_next"),
+            "results": ReviewSerializer(self.context["reviews"], many=True).data,
+        }
+
+    def get_is_featured(self, obj):
+        return self.context["is_featured"]
+
+class NearbyAdvertisementSerializer(AdvertisementListSerializer):
+    distance = serializers.FloatField(read_only=True, help_text="Distance from the search point in km")
+
+    class Meta(AdvertisementListSerializer.Meta):
+        fields = AdvertisementListSerializer.Meta.fields + ["distance"]
+
 # Custom User serializers
 class UserListSerializer(serializers.ModelSerializer):
+    rating_average = serializers.FloatField(read_only=True)
+
     class Meta:
         model = CustomUser
         
         id = model.id
-        fields = ["id","first_name", "last_name", "email", "phone", "created_on","last_login"]
+        fields = ["id","first_name", "last_name", "email", "phone", "created_on","last_login", "review_count", "rating_average"]
 
 class UserManagementSerializer(serializers.ModelSerializer):
     profile_picture = serializers.ImageField(required=False)
+    rating_average = serializers.FloatField(read_only=True)
 
     class Meta:
         model = CustomUser
-        fields = ['id', 'first_name', 'last_name', 'email', 'phone', 'is_active', 'is_staff', 'is_superuser', 'profile_picture']
-        read_only_fields = ['id', 'created_on', 'updated_on']
+        fields = ['id', 'first_name', 'last_name', 'email', 'phone', 'is_active', 'is_staff', 'is_superuser', 'profile_picture', 'review_count', 'rating_average']
+        read_only_fields = ['id', 'created_on', 'updated_on', 'review_count']
     
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -379,8 +588,8 @@ class MailSerializer(serializers.Serializer):
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = db.Reviews
-        fields = ['id', 'advertisement', 'message', 'rating']
-        read_only_fields = ['id']
+        fields = ['id', 'advertisement', 'message', 'rating', 'created_on']
+        read_only_fields = ['id', 'created_on']
 
     def validate(self, data):
         user = self.context['request'].user
@@ -1,27 +1,122 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Category, CategoryRelations, CategoryHierarchy
-
-@receiver(post_save, sender=CategoryRelations)
-def update_hierarchy_level(sender, instance, created, **kwargs):
-    if created:
-        parent_level = instance.parent.hierarchy_level
-        instance.child.hierarchy_level = parent_level + 1
-        instance.child.save()
-
-        # Also update the CategoryHierarchy table
-        CategoryHierarchy.objects.update_or_create(
-            category=instance.child,
-            defaults={'hierarchy_level': instance.child.hierarchy_level}
-        )
-
-@receiver(post_delete, sender=CategoryRelations)
-def reset_hierarchy_level(sender, instance, **kwargs):
-    instance.child.hierarchy_level = 0
-    instance.child.save()
-
-    # Also update the CategoryHierarchy table
-    CategoryHierarchy.objects.update_or_create(
-        category=instance.child,
-        defaults={'hierarchy_level': instance.child.hierarchy_level}
-    )
+from django.utils import timezone
+from knox.models import AuthToken
+from .models import Advertisement, AdvertisementPhoto, ArchivedAdvertisementPhoto, Category, CustomUser, FeaturedAdvertisement, MailAttachment, Subscription
+from .utils.counters import views_flushed
+from .utils import renditions
+from . import archive
+from . import authentication
+from . import duplicates
+from . import featured
+from . import leaderboards
+from . import ratings
+from . import response_cache
+from . import search
+from . import trending
+
+@receiver(post_save, sender=Advertisement)
+def update_advertisement_search_index(sender, instance, **kwargs):
+    search.update_search_index(instance)
+
+@receiver(post_delete, sender=Advertisement)
+def remove_advertisement_search_index(sender, instance, **kwargs):
+    if not archive.in_progress():
+        search.remove_from_search_index(instance)
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def invalidate_advertisement_leaderboards(sender, instance, **kwargs):
+    if not archive.in_progress():
+        leaderboards.invalidate(instance)
+
+@receiver(post_save, sender=Advertisement)
+def transfer_seller_ratings(sender, instance, created, **kwargs):
+    loaded_user_id = getattr(instance, "_loaded_user_id", None)
+    if not created and loaded_user_id is not None and loaded_user_id != instance.user_id:
+        ratings.transfer(instance.pk, loaded_user_id, instance.user_id)
+    instance._loaded_user_id = instance.user_id
+
+@receiver(post_delete, sender=Advertisement)
+def remove_seller_ratings(sender, instance, **kwargs):
+    # Archived ads keep counting towards their seller
+    if instance.rating_count and not archive.in_progress():
+        ratings.adjust_seller(instance.user_id, -instance.rating_count, -instance.rating_sum)
+
+@receiver(views_flushed)
+def update_leaderboards(sender, deltas, **kwargs):
+    leaderboards.apply_view_deltas(deltas)
+
+@receiver(views_flushed)
+def update_trending_scores(sender, deltas, **kwargs):
+    trending.record_view_deltas(deltas)
+
+@receiver(post_save, sender=AdvertisementPhoto)
+def generate_photo_renditions(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "photo" in update_fields:
+        renditions.schedule(instance)
+
+@receiver(post_save, sender=AdvertisementPhoto)
+@receiver(post_delete, sender=AdvertisementPhoto)
+def touch_photo_advertisement(sender, instance, **kwargs):
+    # Keeps updated_on, and with it the ad's ETag, in step with its photos
+    if not archive.in_progress():
+        Advertisement.objects.filter(pk=instance.advert_id).update(updated_on=timezone.now())
+
+@receiver(post_delete, sender=AdvertisementPhoto)
+@receiver(post_delete, sender=ArchivedAdvertisementPhoto)
+def delete_photo_renditions(sender, instance, **kwargs):
+    if sender is AdvertisementPhoto and archive.in_progress():
+        return
+    renditions.delete_renditions(instance)
+
+@receiver(post_delete, sender=AdvertisementPhoto)
+@receiver(post_delete, sender=ArchivedAdvertisementPhoto)
+@receiver(post_delete, sender=MailAttachment)
+def release_stored_file(sender, instance, **kwargs):
+    if sender is AdvertisementPhoto and archive.in_progress():
+        # The archived copy holds the reference now
+        return
+    # Drops a reference to the shared blob; the file goes when the last one does
+    field = instance.file if sender is MailAttachment else instance.photo
+    if field:
+        field.storage.delete(field.name)
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+@receiver(post_save, sender=AdvertisementPhoto)
+@receiver(post_delete, sender=AdvertisementPhoto)
+def invalidate_advertisement_responses(sender, **kwargs):
+    if not archive.in_progress():
+        response_cache.bump(response_cache.ADVERTISEMENTS)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, **kwargs):
+    # Ad lists are filtered by category classification, so they go stale too
+    response_cache.bump(response_cache.CATEGORIES, response_cache.ADVERTISEMENTS)
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=FeaturedAdvertisement)
+@receiver(post_delete, sender=FeaturedAdvertisement)
+def invalidate_featured_set(sender, **kwargs):
+    if not archive.in_progress():
+        featured.invalidate()
+
+@receiver(post_save, sender=Advertisement)
+def index_advertisement_fingerprint(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        duplicates.index(instance)
+
+@receiver(post_delete, sender=AuthToken)
+def evict_deleted_token(sender, instance, **kwargs):
+    # Logout and LogoutAll delete tokens, as does knox when they expire
+    authentication.token_cache.discard(instance.digest)
+    authentication.revoke_user(instance.user_id)
+
+@receiver(post_save, sender=CustomUser)
+def evict_saved_user_tokens(sender, instance, created, **kwargs):
+    # Cached tokens carry a copy of the user, which must not outlive a deactivation or permission change
+    if not created:
+        authentication.revoke_user(instance.pk)
@@ -0,0 +1,206 @@
+import bisect
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from collections import Counter
+
+from django.conf import settings
+
+from .models import Advertisement
+
+INDEX_PATH = getattr(settings, "AD_SIMILAR_INDEX_PATH", os.path.join(settings.BASE_DIR, "var", "similar-ads.idx"))
+NUM_FEATURES = 1 << 18
+MAX_POSTINGS = 200  # strongest rows kept per feature, bounds the work of one lookup
+RELOAD_CHECK_INTERVAL = 30  # seconds between checks for a rebuilt index file
+
+MAGIC = b"ADSIM001"
+HEADER = struct.Struct("<8sIII12x")  # magic, rows, features, nnz, padding to 32 bytes
+ID_SIZE = 16
+
+
+def features(title, description, category_id, classification):
+    """Hashed bag of words; title words count twice and the category and classification are features too."""
+    words = re.findall(r"\w+", f"{title} {title} {description}".lower())
+    tokens = [word for word in words if len(word) > 1]
+    tokens += [f"category:{category_id}", f"classification:{classification}"]
+    return Counter(zlib.crc32(token.encode()) % NUM_FEATURES for token in tokens)
+
+
+def build(path=None):
+    """
+    Write a TF-IDF index of every advertisement to `path`, replacing the previous file atomically.
+
+    Layout after the header, all little-endian 4-byte values: ad ids (16 bytes each, sorted),
+    CSR rows (row pointers, feature columns, L2-normalised weights), then the transposed
+    postings (feature pointers, rows, weights) trimmed to the MAX_POSTINGS strongest rows.
+    """
+    path = path or INDEX_PATH
+    rows = sorted(
+        (ad_id.bytes, features(title, description, category_id, classification))
+        for ad_id, title, description, category_id, classification in Advertisement.objects.order_by().values_list(
+            "id", "title", "description", "category_id", "category__classification"
+        ).iterator(chunk_size=2000)
+    )
+
+    document_frequency = Counter()
+    for _, counts in rows:
+        document_frequency.update(counts.keys())
+    total = len(rows)
+    idf = {feature: math.log((1 + total) / (1 + df)) + 1 for feature, df in document_frequency.items()}
+
+    row_ptr, cols, vals = array("I", [0]), array("I"), array("f")
+    postings = {}
+    for row, (_, counts) in enumerate(rows):
+        weights = {feature: (1 + math.log(count)) * idf[feature] for feature, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        for feature in sorted(weights):
+            weight = weights[feature] / norm
+            cols.append(feature)
+            vals.append(weight)
+            postings.setdefault(feature, []).append((weight, row))
+        row_ptr.append(len(cols))
+
+    post_ptr, post_rows, post_vals = array("I", [0]), array("I"), array("f")
+    for feature in range(NUM_FEATURES):
+        for weight, row in heapq.nlargest(MAX_POSTINGS, postings.get(feature, ())):
+            post_rows.append(row)
+            post_vals.append(weight)
+        post_ptr.append(len(post_rows))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as f:
+        f.write(HEADER.pack(MAGIC, total, NUM_FEATURES, len(cols)))
+        f.write(b"".join(ad_id for ad_id, _ in rows))
+        for values in (row_ptr, cols, vals, post_ptr, post_rows, post_vals):
+            if values.itemsize != 4:
+                raise ValueError("Index arrays must hold 4-byte values")
+            f.write(values.tobytes())
+    os.replace(f.name, path)
+    return total
+
+
+class SimilarityIndex:
+    """
+    Read-only view of an index file through mmap, so every worker process shares the same page cache.
+    Lookups touch one CSR row and the postings of its features.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.stat(path).st_mtime
+        magic, self.rows, self.num_features, nnz = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a similar-ads index")
+
+        view = memoryview(self.mmap)
+        offset = HEADER.size
+
+        def take(count, fmt, size=4):
+            nonlocal offset
+            part = view[offset:offset + count * size]
+            offset += count * size
+            return part.cast(fmt) if fmt else part
+
+        self.ids = take(self.rows, None, ID_SIZE)
+        self.row_ptr = take(self.rows + 1, "I")
+        self.cols = take(nnz, "I")
+        self.vals = take(nnz, "f")
+        self.post_ptr = take(self.num_features + 1, "I")
+        self.post_rows = take(self.post_ptr[-1] if self.num_features else 0, "I")
+        self.post_vals = take(len(self.post_rows), "f")
+
+    def ad_id(self, row):
+        return uuid.UUID(bytes=bytes(self.ids[row * ID_SIZE:(row + 1) * ID_SIZE]))
+
+    def row_of(self, ad_id):
+        """Binary search over the sorted id block."""
+        key = ad_id.bytes
+        ids = _IdSequence(self.ids, self.rows)
+        row = bisect.bisect_left(ids, key)
+        return row if row < self.rows and ids[row] == key else None
+
+    def neighbours(self, ad_id, k=10):
+        """[(ad id, cosine similarity)] of the k most similar advertisements."""
+        row = self.row_of(ad_id)
+        if row is None:
+            return []
+
+        scores = {}
+        for i in range(self.row_ptr[row], self.row_ptr[row + 1]):
+            feature, weight = self.cols[i], self.vals[i]
+            for j in range(self.post_ptr[feature], self.post_ptr[feature + 1]):
+                other = self.post_rows[j]
+                if other != row:
+                    scores[other] = scores.get(other, 0.0) + weight * self.post_vals[j]
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ad_id(other), score) for other, score in best]
+
+
+class _IdSequence:
+    """Sequence facade over the packed ids so bisect can search them without copying."""
+
+    def __init__(self, ids, count):
+        self.ids = ids
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        return bytes(self.ids[row * ID_SIZE:(row + 1) * ID_SIZE])
+
+
+_index = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def get_index(path=None):
+    """The current index, reopened when a rebuild replaced the file. None until one is built."""
+    global _index, _last_check
+    path = path or INDEX_PATH
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+            return _index
+        _last_check = now
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            _index = None
+            return None
+        if _index is None or mtime != _index.mtime:
+            _index = SimilarityIndex(path)
+        return _index
+
+
+def reset():
+    """Forget the open index, e.g. after a rebuild in the same process."""
+    global _index, _last_check
+    with _lock:
+        _index, _last_check = None, 0.0
+
+
+def similar_ad_ids(advertisement, k=10):
+    """Ids of the ads most like this one; the same category's newest ads until an index has been built."""
+    index = get_index()
+    if index is not None:
+        ids = [ad_id for ad_id, _ in index.neighbours(advertisement.pk, k)]
+        if ids:
+            return ids
+    return list(
+        Advertisement.objects.filter(category_id=advertisement.category_id)
+        .exclude(pk=advertisement.pk).order_by("-created_on", "-id").values_list("id", flat=True)[:k]
+    )
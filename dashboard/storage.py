@@ -0,0 +1,80 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+
+class DeduplicatingStorage(FileSystemStorage):
+    """
+    Content-addressed file storage.
+
+    Uploads are hashed chunk by chunk and stored once per distinct content at
+    `<upload dir>/<sha256><ext>`. Saving content that is already stored only bumps the
+    blob's reference count, and delete() removes the file once no references remain and
+    that delete has committed. Callers that show or send a file keep its original name themselves.
+    Files saved before this storage was enabled have no blob row and are handled as usual.
+    """
+
+    def content_hash(self, content):
+        digest = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        return digest.hexdigest()
+
+    def _save(self, name, content):
+        from dashboard.models import MediaBlob
+
+        content_hash = self.content_hash(content)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        blob_name = os.path.join(directory, f"{content_hash}{extension}")
+
+        # The row stays locked until the transaction ends, so a concurrent upload of the same content
+        # waits here and then sees the committed count and file
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                hash=content_hash, defaults={"name": blob_name, "size": content.size}
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+            if not super().exists(blob.name):
+                # New content, or a blob whose file went missing; references already counted keep pointing at it
+                super()._save(blob.name, content)
+        return blob.name
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content hash in _save(), so never suffix them
+        return name
+
+    def delete(self, name):
+        from dashboard.models import MediaBlob
+
+        if not name:
+            raise ValueError("The name must be given to delete().")
+
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            # A rollback would bring the blob row back, so only unlink once the delete has committed
+            transaction.on_commit(lambda: self.discard_unsaved(name))
+
+    def discard_unsaved(self, name):
+        """
+        Unlink a file no blob row claims any more; call it once the transaction of a save or delete has ended.
+        After a rolled back save, the rollback already undid any reference the save added to an existing
+        blob, so only a file whose blob row was rolled back with it is removed.
+        """
+        from dashboard.models import MediaBlob
+
+        if name and not MediaBlob.objects.filter(name=name).exists():
+            super().delete(name)
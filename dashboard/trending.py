@@ -0,0 +1,102 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Advertisement, AdvertisementViewBucket
+
+HALF_LIFE_HOURS = getattr(settings, "AD_TRENDING_HALF_LIFE_HOURS", 6)
+WINDOW_HOURS = getattr(settings, "AD_TRENDING_WINDOW_HOURS", 48)
+RESULTS_TTL = getattr(settings, "AD_TRENDING_CACHE_TTL", 5 * 60)
+SCORES_TTL = 60 * 60  # full rebuild from the buckets at least this often, even without new views
+TRENDING_SIZE = 20
+
+DECAY = math.log(2) / HALF_LIFE_HOURS
+SCORES_KEY = "trending:scores"
+
+
+def results_key(classification):
+    return f"trending:results:{classification or 'all'}"
+
+
+def current_hour(now=None):
+    now = now or timezone.now()
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def decayed(score, since, now):
+    """Decay a score measured at `since` to `now` with the configured half-life."""
+    hours = (now - since).total_seconds() / 3600
+    return score * math.exp(-DECAY * hours)
+
+
+def record_view_deltas(deltas, now=None):
+    """Add flushed views to this hour's buckets and drop the cached scores built from the previous counts."""
+    now = now or timezone.now()
+    hour = current_hour(now)
+
+    for ad_id, delta in deltas.items():
+        updated = AdvertisementViewBucket.objects.filter(advertisement_id=ad_id, hour=hour).update(views=F("views") + delta)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    AdvertisementViewBucket.objects.create(advertisement_id=ad_id, hour=hour, views=delta)
+            except IntegrityError:
+                # Another worker created the bucket first
+                AdvertisementViewBucket.objects.filter(advertisement_id=ad_id, hour=hour).update(views=F("views") + delta)
+
+    # The buckets are the only counts; dropping the scores makes the next read rebuild them from the buckets.
+    # Unlike folding the deltas into the cached scores, deleting is idempotent, so flushes running at once
+    # in several workers cannot overwrite each other's views
+    cache.delete(SCORES_KEY)
+
+
+def rebuild_scores(now=None):
+    """Recompute every score from the buckets in the window and drop buckets that fell out of it."""
+    now = now or timezone.now()
+    cutoff = current_hour(now) - timedelta(hours=WINDOW_HOURS)
+    AdvertisementViewBucket.objects.filter(hour__lt=cutoff).delete()
+
+    scores = {}
+    for ad_id, hour, views in AdvertisementViewBucket.objects.values_list("advertisement_id", "hour", "views"):
+        score, _ = scores.get(ad_id, (0.0, now))
+        scores[ad_id] = (score + decayed(views, hour, now), now)
+
+    cache.set(SCORES_KEY, scores, timeout=SCORES_TTL)
+    return scores
+
+
+def trending_ad_ids(classification=None, now=None):
+    """Ids of the highest scoring advertisements, optionally within one classification."""
+    key = results_key(classification)
+    ids = cache.get(key)
+    if ids is not None:
+        return ids
+
+    now = now or timezone.now()
+    scores = cache.get(SCORES_KEY)
+    if scores is None:
+        scores = rebuild_scores(now)
+
+    ranked = sorted(scores, key=lambda ad_id: decayed(*scores[ad_id], now), reverse=True)
+    if classification:
+        in_scope = set(
+            Advertisement.objects.filter(pk__in=ranked, category__classification=classification).values_list("id", flat=True)
+        )
+        ranked = [ad_id for ad_id in ranked if ad_id in in_scope]
+
+    ids = ranked[:TRENDING_SIZE]
+    cache.set(key, ids, timeout=RESULTS_TTL)
+    return ids
+
+
+def trending_ads(classification=None, queryset=None):
+    """Trending advertisements, best first."""
+    queryset = queryset if queryset is not None else Advertisement.objects.all()
+    ids = trending_ad_ids(classification)
+    ads = {ad.pk: ad for ad in queryset.filter(pk__in=ids)}
+    return [ads[ad_id] for ad_id in ids if ad_id in ads]
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload too large."
+    default_code = "upload_too_large"
+
+
+class UploadLimitHandler(FileUploadHandler):
+    """
+    Enforce upload limits while the multipart body is being read.
+
+    Sits in front of Django's memory and temporary-file handlers and passes every
+    chunk on unchanged, so files still stream to disk. Requests whose declared length
+    is over the limit are rejected before any of the body is read.
+    """
+
+    def __init__(self, request=None, max_file_size=None, max_files=None, max_request_size=None):
+        super().__init__(request)
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.max_request_size = max_request_size
+        self.file_count = 0
+        self.total_size = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if self.max_request_size and content_length and content_length > self.max_request_size:
+            raise UploadTooLarge(f"Uploads may not exceed {self.max_request_size} bytes per request.")
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file_count += 1
+        if self.max_files is not None and self.file_count > self.max_files:
+            raise UploadTooLarge(f"At most {self.max_files} files may be uploaded per request.")
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_size += len(raw_data)
+        if self.max_file_size and start + len(raw_data) > self.max_file_size:
+            raise UploadTooLarge(f"{self.file_name} is larger than {self.max_file_size} bytes.")
+        if self.max_request_size and self.total_size > self.max_request_size:
+            raise UploadTooLarge(f"Uploads may not exceed {self.max_request_size} bytes per request.")
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class UploadLimitMixin:
+    """
+    Apply per-file, file-count and per-request upload limits to an API view.
+    Views may override the limits; unset ones come from the UPLOAD_MAX_* settings.
+    """
+    upload_max_file_size = None
+    upload_max_files = None
+    upload_max_request_size = None
+
+    def get_upload_limits(self):
+        return {
+            "max_file_size": self.upload_max_file_size or getattr(settings, "UPLOAD_MAX_FILE_SIZE", 10 * 1024 * 1024),
+            "max_files": self.upload_max_files or getattr(settings, "UPLOAD_MAX_FILES", 10),
+            "max_request_size": self.upload_max_request_size or getattr(settings, "UPLOAD_MAX_REQUEST_SIZE", 50 * 1024 * 1024),
+        }
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Handlers must be in place before DRF first touches request.data
+        request.upload_handlers = [UploadLimitHandler(request, **self.get_upload_limits()), *request.upload_handlers]
+        return super().initialize_request(request, *args, **kwargs)
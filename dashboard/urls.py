@@ -32,16 +32,24 @@ urlpatterns = [
     path('categories/', views.CategoryList.as_view(), name="categories"),
     path('categories/new', views.NewCategory.as_view(), name="new-category"),
     path('category/<pk>', views.CategoryDetail.as_view(), name="category-detail"),
+    path('category/<pk>/children', views.CategoryChildren.as_view(), name="category-children"),
     
     # ADs
     path("ads/", views.AdsList.as_view(), name="ads"),
     path('ads/user/list', views.UserAdsList.as_view(), name="user-ads"),
     path("ads/new", views.NewAd.as_view(), name="new-ad"),
+    path("ads/import", views.BulkAdImport.as_view(), name="import-ads"),
     path("ads/detail/<pk>", views.AdDetail.as_view(), name="ad-detail"),
+    path("ads/<pk>/full", views.AdFull.as_view(), name="ad-full"),
+    path("ads/<pk>/similar", views.SimilarAds.as_view(), name="similar-ads"),
     
     path("ads/produce", views.ProduceAdsList.as_view(), name="produce-ads"),    
     path("ads/inputs", views.InputAdsList.as_view(), name="input-ads"),    
     path("ads/services", views.ServiceAdsList.as_view(), name="service-ads"),
+    path("ads/search", views.AdSearch.as_view(), name="search-ads"),
+    path("ads/filter", views.AdFilter.as_view(), name="filter-ads"),
+    path("ads/trending", views.TrendingAds.as_view(), name="trending-ads"),
+    path("ads/near", views.AdsNear.as_view(), name="ads-near"),
     
     #path("ads/produce/<pk>", views.ProduceAdDetail.as_view(), name="produce-ads-detail"),
     #path("ads/inputs/<pk>", views.InputAdDetail.as_view(), name="input-ads-detail"),
@@ -51,6 +59,7 @@ urlpatterns = [
     path('ads/produce/top', views.TopProduceAds.as_view(), name='top-produce-ads'),
     path('ads/inputs/top', views.TopInputAds.as_view(), name='top-input-ads'),
     path('ads/services/top', views.TopServiceAds.as_view(), name='top-service-ads'),
+    path('category/<pk>/ads/top', views.TopCategoryAds.as_view(), name='top-category-ads'),
     
     # Reviews
     path('reviews/new', views.ReviewCreateView.as_view(), name='new-review'),
@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image
+
+from dashboard import duplicates, leaderboards, response_cache, search
+from dashboard import models as db
+from dashboard.utils import renditions
+from dashboard.serializers import AdvertisementImportRowSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_ROWS = getattr(settings, "AD_IMPORT_MAX_ROWS", 5000)
+MAX_PHOTOS = getattr(settings, "AD_IMPORT_MAX_PHOTOS", 1000)
+MAX_PHOTO_SIZE = getattr(settings, "AD_IMPORT_MAX_PHOTO_SIZE", 10 * 1024 * 1024)
+
+
+class BulkImportError(Exception):
+    pass
+
+
+class AdvertisementImporter:
+    """
+    Validate and insert a batch of advertisements for one user.
+
+    Rows come from CSV or JSON and may name photos inside an optional zip archive.
+    Every row is validated before anything is written; ads and photos are then
+    inserted with bulk_create in chunks inside a single transaction.
+    """
+
+    def __init__(self, user, chunk_size=500):
+        self.user = user
+        self.chunk_size = chunk_size
+
+    def parse(self, data_file, file_format=None):
+        """Read rows from a CSV or JSON file; the format defaults to the file extension."""
+        file_format = (file_format or os.path.splitext(getattr(data_file, "name", ""))[1].lstrip(".")).lower()
+        content = data_file.read()
+        if isinstance(content, bytes):
+            try:
+                content = content.decode("utf-8-sig")
+            except UnicodeDecodeError:
+                raise BulkImportError("The import file must be UTF-8 encoded; save it as \"CSV UTF-8\" and try again.")
+
+        if file_format == "csv":
+            try:
+                rows = [dict(row) for row in csv.DictReader(io.StringIO(content))]
+            except csv.Error as e:
+                raise BulkImportError(f"Invalid CSV: {e}")
+        elif file_format == "json":
+            try:
+                rows = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise BulkImportError(f"Invalid JSON: {e}")
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise BulkImportError("JSON imports must be a list of objects.")
+        else:
+            raise BulkImportError("Unsupported format, upload a .csv or .json file.")
+
+        if not rows:
+            raise BulkImportError("The import file has no rows.")
+        if len(rows) > MAX_ROWS:
+            raise BulkImportError(f"An import may contain at most {MAX_ROWS} rows.")
+        return rows
+
+    def check_archive(self, archive):
+        """Reject archives with too many members or members too large, from the zip directory alone."""
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > MAX_PHOTOS:
+            raise BulkImportError(f"The photos archive may contain at most {MAX_PHOTOS} files.")
+        for info in members:
+            if info.file_size > MAX_PHOTO_SIZE:
+                raise BulkImportError(f"{info.filename} is larger than {MAX_PHOTO_SIZE} bytes.")
+
+    def is_image(self, archive, name):
+        """Whether an archive member is an image Pillow can read; the size cap bounds what is decompressed."""
+        try:
+            with archive.open(name) as member, Image.open(member) as image:
+                image.verify()
+        except Exception:
+            return False
+        return True
+
+    def validate(self, rows, archive=None):
+        """Return (valid rows as (row number, data), per-row error report)."""
+        category_ids = set()
+        for row in rows:
+            try:
+                category_ids.add(uuid.UUID(str(row.get("category"))))
+            except ValueError:
+                pass
+
+        context = {
+            "categories": db.Category.objects.in_bulk(category_ids),
+            "photo_names": set(archive.namelist()) if archive else set(),
+        }
+
+        images = {}
+        valid, errors = [], []
+        for number, row in enumerate(rows, start=1):
+            serializer = AdvertisementImportRowSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                errors.append({"row": number, "errors": serializer.errors})
+                continue
+            for name in serializer.validated_data["photos"]:
+                if name not in images:
+                    images[name] = self.is_image(archive, name)
+            not_images = [name for name in serializer.validated_data["photos"] if not images[name]]
+            if not_images:
+                errors.append({"row": number, "errors": {"photos": [f"Not an image: {', '.join(not_images)}"]}})
+            else:
+                valid.append((number, serializer.validated_data))
+        return valid, errors
+
+    def insert(self, valid_rows, archive=None):
+        """Bulk insert validated rows and their photos. Returns the created advertisements."""
+        created, created_photos = [], []
+        saved_files = []
+        try:
+            with transaction.atomic():
+                for start in range(0, len(valid_rows), self.chunk_size):
+                    chunk = valid_rows[start:start + self.chunk_size]
+                    ads, photos = [], []
+                    for _, data in chunk:
+                        photo_names = data.pop("photos", [])
+                        ad = db.Advertisement(user=self.user, **data)
+                        ad.update_coordinates()
+                        ads.append(ad)
+                        for name in photo_names:
+                            photo = db.AdvertisementPhoto(advert=ad)
+                            with archive.open(name) as member:
+                                photo.photo.save(os.path.basename(name), File(member), save=False)
+                            saved_files.append(photo.photo.name)
+                            photos.append(photo)
+
+                    db.Advertisement.objects.bulk_create(ads)
+                    db.AdvertisementPhoto.objects.bulk_create(photos)
+                    created.extend(ads)
+                    created_photos.extend(photos)
+
+                # bulk_create skips save() and its signals
+                search.update_search_index_bulk(created)
+                duplicates.index_bulk(created)
+                for photo in created_photos:
+                    renditions.schedule(photo)
+        except Exception:
+            # The rollback dropped the photo rows and blob references; delete() would now take a
+            # reference away from photos that already shared one of these files
+            for name in saved_files:
+                db.AdvertisementPhoto.photo.field.storage.discard_unsaved(name)
+            raise
+
+        response_cache.bump(response_cache.ADVERTISEMENTS)
+        leaderboards.invalidate_scopes(
+            {ad.category.classification for ad in created}, {ad.category_id for ad in created}
+        )
+        return created
+
+    def run(self, data_file, photos_file=None, file_format=None, allow_partial=False):
+        """
+        Import a file. Returns a report with the created ids and per-row errors.
+        Unless `allow_partial` is set, nothing is inserted when any row is invalid.
+        """
+        rows = self.parse(data_file, file_format)
+        archive = None
+        if photos_file is not None:
+            try:
+                archive = zipfile.ZipFile(photos_file)
+            except zipfile.BadZipFile:
+                raise BulkImportError("The photos upload is not a valid zip archive.")
+
+        try:
+            if archive:
+                self.check_archive(archive)
+            valid, errors = self.validate(rows, archive)
+            created = []
+            if valid and (allow_partial or not errors):
+                created = self.insert(valid, archive)
+        finally:
+            if archive:
+                archive.close()
+
+        logger.info(f"Imported {len(created)} of {len(rows)} advertisements for {self.user.pk}")
+        return {
+            "total": len(rows),
+            "created": len(created),
+            "ids": [ad.pk for ad in created],
+            "errors": errors,
+        }
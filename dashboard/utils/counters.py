@@ -0,0 +1,129 @@
+import atexit
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent with `deltas` ({ad_id: views added}) after buffered views are written
+views_flushed = Signal()
+
+BOT_USER_AGENT = re.compile(r"bot|crawl|spider|slurp|preview|monitor|curl|wget|python-requests", re.IGNORECASE)
+
+
+class AdViewCounter:
+    """
+    Buffer advertisement view increments in memory and write them in batches.
+
+    Each flush issues one `UPDATE ... SET views = views + delta` per advertisement,
+    so concurrent workers never overwrite each other's counts. Repeat views from the
+    same client within the dedup window and requests from bots are not counted.
+
+    A daemon thread started by the first recorded view flushes every `flush_interval`
+    seconds, so requests never wait on the writes and a killed worker loses at most
+    one interval of views.
+    """
+
+    def __init__(self, flush_interval=None, dedup_window=None):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(settings, "AD_VIEW_FLUSH_INTERVAL", 60)
+        self.dedup_window = dedup_window if dedup_window is not None else getattr(settings, "AD_VIEW_DEDUP_WINDOW", 30 * 60)
+        self.pending = defaultdict(int)
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.flusher_pid = None
+        self.stopped = threading.Event()
+
+    def get_client_fingerprint(self, request):
+        """Identify the viewer by user id, or by IP address and user agent for anonymous requests."""
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+
+        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+        ip = x_forwarded_for.split(",")[0] if x_forwarded_for else request.META.get("REMOTE_ADDR")
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        return "anon:" + hashlib.sha1(f"{ip}|{user_agent}".encode()).hexdigest()
+
+    def is_bot(self, request):
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        return not user_agent or bool(BOT_USER_AGENT.search(user_agent))
+
+    def record(self, ad_id, request):
+        """Count a view of the advertisement unless it is a bot or a duplicate. Returns True if counted."""
+        if self.is_bot(request):
+            return False
+
+        # One cache write per view: an INSERT on the default database cache, a SET NX on Redis
+        dedup_key = f"ad-view:{ad_id}:{self.get_client_fingerprint(request)}"
+        if not cache.add(dedup_key, 1, timeout=self.dedup_window):
+            return False
+
+        with self.lock:
+            self.pending[ad_id] += 1
+        self.start_flusher()
+        return True
+
+    def start_flusher(self):
+        """Start the background flush thread of this process, again in a worker forked after it started."""
+        with self.lock:
+            if self.flusher is not None and self.flusher_pid == os.getpid() and self.flusher.is_alive():
+                return
+            self.flusher_pid = os.getpid()
+            self.flusher = threading.Thread(target=self.run_flusher, name="ad-view-flusher", daemon=True)
+            self.flusher.start()
+
+    def run_flusher(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                # The thread's own connection would otherwise stay open between flushes
+                connection.close()
+
+    def stop(self):
+        """Stop the background thread and write what is still buffered, e.g. at interpreter exit."""
+        self.stopped.set()
+        self.flush()
+
+    def pending_views(self, ad_id):
+        """Views recorded for the advertisement that have not been written yet."""
+        with self.lock:
+            return self.pending.get(ad_id, 0)
+
+    def flush(self):
+        """Write all buffered increments to the database. Returns the flushed deltas keyed by ad id."""
+        from dashboard.models import Advertisement
+
+        with self.lock:
+            deltas = dict(self.pending)
+            self.pending.clear()
+
+        if not deltas:
+            return deltas
+
+        try:
+            with transaction.atomic():
+                for ad_id, delta in deltas.items():
+                    Advertisement.objects.filter(pk=ad_id).update(views=F("views") + delta)
+        except Exception:
+            logger.exception("Failed to flush advertisement view counts")
+            with self.lock:
+                for ad_id, delta in deltas.items():
+                    self.pending[ad_id] += delta
+            return {}
+
+        views_flushed.send(sender=self.__class__, deltas=deltas)
+        return deltas
+
+
+ad_views = AdViewCounter()
+atexit.register(ad_views.stop)
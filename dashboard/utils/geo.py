@@ -0,0 +1,86 @@
+import math
+import re
+from urllib.parse import parse_qs, unquote, urlparse
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+COORDINATE_PAIR = r"(-?\d{1,3}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)"
+
+
+def valid_coordinates(latitude, longitude):
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+def to_coordinates(latitude, longitude):
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    return (latitude, longitude) if valid_coordinates(latitude, longitude) else None
+
+
+def parse_coordinates(url):
+    """
+    Extract (latitude, longitude) from a maps link.
+
+    Understands Google Maps pins (`!3d<lat>!4d<lng>`), `@lat,lng` viewports, `q`/`ll`/`query`
+    parameters, OpenStreetMap `mlat`/`mlon` and `#map=zoom/lat/lng`, and `geo:` URIs.
+    Returns None when no coordinates can be found, e.g. for shortened links.
+    """
+    if not url:
+        return None
+
+    url = unquote(url.strip())
+
+    # The dropped pin is more precise than the viewport centre
+    match = re.search(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)", url)
+    if match:
+        return to_coordinates(*match.groups())
+
+    if url.startswith("geo:"):
+        match = re.match(r"geo:" + COORDINATE_PAIR, url)
+        return to_coordinates(*match.groups()) if match else None
+
+    parsed = urlparse(url)
+    params = parse_qs(parsed.query)
+
+    for key in ("q", "query", "ll", "center", "destination", "daddr"):
+        for value in params.get(key, []):
+            match = re.fullmatch(COORDINATE_PAIR, value.strip())
+            if match:
+                return to_coordinates(*match.groups())
+
+    if "mlat" in params and "mlon" in params:
+        return to_coordinates(params["mlat"][0], params["mlon"][0])
+
+    match = re.search(r"@" + COORDINATE_PAIR, parsed.path)
+    if match:
+        return to_coordinates(*match.groups())
+
+    match = re.search(r"map=\d+(?:\.\d+)?/(-?\d+(?:\.\d+)?)/(-?\d+(?:\.\d+)?)", parsed.fragment)
+    if match:
+        return to_coordinates(*match.groups())
+
+    return None
+
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing every point within `radius_km`."""
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - d_lat, -90.0),
+        min(latitude + d_lat, 90.0),
+        max(longitude - d_lng, -180.0),
+        min(longitude + d_lng, 180.0),
+    )
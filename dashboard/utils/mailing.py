@@ -5,6 +5,7 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.conf import settings
 import logging
+import mimetypes
 from django.utils import timezone
 from dashboard.models import CustomUser as User
 import time
@@ -135,7 +136,7 @@ def send_email(from_email, recipient, subject, message, attachment_paths=None, h
     :param recipient: The recipient's email address.
     :param subject: The subject of the email.
     :param message: The plain text message content of the email.
-    :param attachment_paths: List of file paths for attachments.
+    :param attachment_paths: List of file paths for attachments, or (path, filename) pairs to send a file under another name.
     :param html_message: Optional HTML content for the email.
     """
     email = EmailMessage(
@@ -150,8 +151,13 @@ def send_email(from_email, recipient, subject, message, attachment_paths=None, h
 
     if attachment_paths:
         for path in attachment_paths:
+            path, filename = path if isinstance(path, tuple) else (path, None)
             try:
-                email.attach_file(path)
+                if filename:
+                    with open(path, "rb") as f:
+                        email.attach(filename, f.read(), mimetypes.guess_type(filename)[0])
+                else:
+                    email.attach_file(path)
             except Exception as e:
                 logger.error(f"Failed to attach file {path}: {str(e)}")
                 raise
@@ -0,0 +1,61 @@
+import hashlib
+import random
+import re
+import struct
+import zlib
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stay comparable across processes and deploys
+_random = random.Random(1729)
+PERMUTATIONS = [(_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Character shingles of the normalized text, hashed to 32 bits."""
+    text = normalize(text)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())} if text else set()
+    return {zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1)}
+
+
+def signature(text):
+    """MinHash signature: the minimum of each permuted shingle hash. Empty text gets an all-max signature."""
+    hashes = shingles(text)
+    if not hashes:
+        return [MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in PERMUTATIONS]
+
+
+def to_bytes(sig):
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+
+def from_bytes(data):
+    return list(struct.unpack(f"<{NUM_PERM}I", bytes(data)))
+
+
+def band_hashes(sig):
+    """(band, bucket) pairs: each band of ROWS values hashed to a signed 64-bit integer."""
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(struct.pack(f"<{ROWS}I", *sig[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+            "little", signed=True,
+        ))
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig1, sig2):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / NUM_PERM
@@ -0,0 +1,205 @@
+import atexit
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from dashboard import response_cache
+
+logger = logging.getLogger(__name__)
+
+# name -> longest edge in pixels, output format and quality
+RENDITIONS = {
+    "thumbnail": {"size": 240, "format": "JPEG", "quality": 80},
+    "medium": {"size": 800, "format": "JPEG", "quality": 85},
+    "webp": {"size": 1600, "format": "WEBP", "quality": 80},
+}
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+RENDITIONS_DIR = "ad-images/renditions"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render(source):
+    """
+    Resize an image (path or bytes) into every rendition. Returns {name: encoded bytes}.
+    Runs in the worker processes, so it must not touch Django.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white, JPEG has no alpha channel
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        rendered = {}
+        for name, spec in RENDITIONS.items():
+            copy = image.copy()
+            copy.thumbnail((spec["size"], spec["size"]), Image.LANCZOS)
+            output = io.BytesIO()
+            copy.save(output, spec["format"], quality=spec["quality"], optimize=True)
+            rendered[name] = output.getvalue()
+        return rendered
+
+
+def rendition_path(photo_name, name):
+    stem = os.path.splitext(os.path.basename(photo_name))[0]
+    return f"{RENDITIONS_DIR}/{stem}_{name}.{EXTENSIONS[RENDITIONS[name]['format']]}"
+
+
+def render_source(photo):
+    """Hand workers a filesystem path when possible so large originals are not piped across processes."""
+    try:
+        return photo.photo.path
+    except NotImplementedError:
+        with photo.photo.open("rb") as f:
+            return f.read()
+
+
+def delete_renditions(photo):
+    storage = photo.photo.storage
+    for path in (photo.renditions or {}).values():
+        storage.delete(path)
+
+
+def store(photo_id, photo_name, rendered):
+    """Save rendered images and record their paths, unless the photo was deleted or replaced meanwhile."""
+    from dashboard.models import Advertisement, AdvertisementPhoto
+
+    photo = AdvertisementPhoto.objects.filter(pk=photo_id).first()
+    if photo is None or photo.photo.name != photo_name:
+        return None
+
+    delete_renditions(photo)
+    storage = photo.photo.storage
+    paths = {name: storage.save(rendition_path(photo_name, name), ContentFile(data)) for name, data in rendered.items()}
+    AdvertisementPhoto.objects.filter(pk=photo_id).update(renditions=paths)
+    # update() sends no signals, so refresh cached ad lists and validators that embed the photo
+    Advertisement.objects.filter(pk=photo.advert_id).update(updated_on=timezone.now())
+    response_cache.bump(response_cache.ADVERTISEMENTS)
+    return paths
+
+
+def generate(photo):
+    """Render and store the renditions of one photo in the current process."""
+    try:
+        rendered = render(render_source(photo))
+    except Exception:
+        logger.exception(f"Could not render photo {photo.pk}")
+        return None
+    return store(photo.pk, photo.photo.name, rendered)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=getattr(settings, "AD_PHOTO_RENDITION_WORKERS", 2))
+        return _executor
+
+
+def reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+
+
+atexit.register(shutdown)
+
+
+def on_rendered(photo_id, photo_name, future):
+    # Runs on the pool's management thread, which has its own database connection
+    try:
+        store(photo_id, photo_name, future.result())
+    except Exception:
+        logger.exception(f"Could not render photo {photo_id}")
+    finally:
+        connection.close()
+
+
+def submit(photo):
+    try:
+        future = get_executor().submit(render, render_source(photo))
+    except BrokenProcessPool:
+        reset_executor()
+        future = get_executor().submit(render, render_source(photo))
+    future.add_done_callback(lambda f: on_rendered(photo.pk, photo.photo.name, f))
+    return future
+
+
+def schedule(photo):
+    """
+    Generate renditions for a newly saved photo once the transaction commits.
+    Rendering happens in the worker pool unless AD_PHOTO_RENDITIONS_ASYNC is off.
+    """
+    if not photo.photo:
+        return
+
+    def run():
+        if getattr(settings, "AD_PHOTO_RENDITIONS_ASYNC", True):
+            submit(photo)
+        else:
+            generate(photo)
+
+    transaction.on_commit(run)
+
+
+def generate_many(photos, max_in_flight=None):
+    """
+    Render many photos on the worker pool and store results in the calling thread.
+    Returns (rendered, failed) counts.
+    """
+    executor = get_executor()
+    max_in_flight = max_in_flight or getattr(settings, "AD_PHOTO_RENDITION_WORKERS", 2) * 4
+    rendered = failed = 0
+    futures = {}
+
+    def drain(limit):
+        nonlocal rendered, failed
+        for future in as_completed(list(futures)):
+            photo_id, photo_name = futures.pop(future)
+            try:
+                if store(photo_id, photo_name, future.result()) is not None:
+                    rendered += 1
+            except Exception:
+                logger.exception(f"Could not render photo {photo_id}")
+                failed += 1
+            if len(futures) <= limit:
+                return
+
+    for photo in photos:
+        try:
+            futures[executor.submit(render, render_source(photo))] = (photo.pk, photo.photo.name)
+        except FileNotFoundError:
+            logger.warning(f"Photo {photo.pk} is missing from storage")
+            failed += 1
+            continue
+        if len(futures) >= max_in_flight:
+            drain(max_in_flight // 2)
+
+    if futures:
+        drain(0)
+    return rendered, failed
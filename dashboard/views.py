@@ -1,6 +1,6 @@
 from rest_framework.renderers import JSONRenderer
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ParseError
 from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -10,7 +10,6 @@ from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 from rest_framework import permissions
 
-from knox.auth import TokenAuthentication
 from knox.views import LoginView, APIView
 from knox.models import AuthToken
 
@@ -20,7 +19,6 @@ from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.storage import default_storage
 from django.contrib.auth.models import AnonymousUser
-from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 
 from django.contrib.auth import get_user_model
@@ -35,20 +33,42 @@ from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import IntegrityError
 from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 
 from . import models as  db
 from . import serializers
 
 from .analytics import Analytics
+from .authentication import CachedTokenAuthentication
+from .uploads import UploadLimitMixin
+from .response_cache import CachedListMixin
+from . import response_cache
+from .conditional import ConditionalListMixin
+from . import conditional
+from . import archive
+from . import duplicates
+from . import featured
+from .featured import FeaturedFeedMixin
+from .pagination import RecentAdsPagination, PopularAdsPagination, ReviewPagination, SearchResultsPagination
+from . import leaderboards
+from . import ratings
+from . import search
+from . import similar
+from . import trending
 from .serializers import AnalyticsSerializer
 
 from .utils.utils import NormalizeData
+from .utils.counters import ad_views
+from .utils import geo
+from .utils import bulk_import
 from .utils import mailing
 
 from datetime import timezone
 
 import logging
+import os
+import uuid
 import re
 
 
@@ -97,10 +117,28 @@ class AdvertClassificationView(APIView):
         return Response(classifications, status=status.HTTP_200_OK)
 
 # ADCategories
-class CategoryList(generics.ListAPIView):
-    """List all root categories"""
+class CategoryList(CachedListMixin, generics.ListAPIView):
+    """List all root categories, optionally limited to `?depth=N` levels of sub-categories"""
     queryset = db.Category.objects.filter(parent__isnull=True)
     serializer_class = serializers.CategorySerializer
+    cache_resources = (response_cache.CATEGORIES,)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        depth = self.request.query_params.get('depth')
+        if depth is not None:
+            if not depth.isdigit():
+                raise ParseError("Depth must be a non-negative integer.")
+            context['depth'] = int(depth)
+        return context
+
+class CategoryChildren(generics.ListAPIView):
+    """List the direct children of a category with their own child counts"""
+    serializer_class = serializers.CategoryNodeSerializer
+
+    def get_queryset(self):
+        parent = generics.get_object_or_404(db.Category, pk=self.kwargs.get('pk'))
+        return db.Category.objects.filter(parent=parent).annotate(child_count=Count('children')).order_by('-name')
 
 class NewCategory(generics.CreateAPIView):
     """Create a new category"""
@@ -218,10 +256,10 @@ class AdsList(generics.ListAPIView):
     """
     List all Advertisements
     """
-    queryset = db.Advertisement.objects.all()
+    queryset = db.Advertisement.objects.for_listing()
     serializer_class = serializers.AdvertisementSerializer
     permission_classes = [permissions.IsAdminUser, IsAdminOrSelf]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
 class UserAdsList(generics.ListAPIView):
     """
@@ -231,9 +269,9 @@ class UserAdsList(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return db.Advertisement.objects.filter(user=user)
+        return db.Advertisement.objects.for_listing().filter(user=user)
 
-class NewAd(generics.CreateAPIView):
+class NewAd(UploadLimitMixin, generics.CreateAPIView):
     """
     Create new Advertisements
     """
@@ -244,20 +282,76 @@ class NewAd(generics.CreateAPIView):
     #def perform_create(self, serializer):
     #    serializer.save(user=self.request.user)
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.possible_duplicates = duplicates.find_duplicates(serializer.instance)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # Likely reposts of an existing listing, for the client to warn about
+        response.data['possible_duplicates'] = [
+            {"id": ad_id, "similarity": round(score, 2)} for ad_id, score in self.possible_duplicates
+        ]
+        return response
+
+class BulkAdImport(UploadLimitMixin, APIView):
+    """
+    Import many Advertisements at once from a CSV or JSON `file`, with photos in an optional `photos` zip.
+    Rows list photos by their name in the archive (`;`-separated in CSV). Set `partial` to keep valid rows
+    when others fail; otherwise nothing is created unless every row is valid.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+    # The data file and the photos archive
+    upload_max_files = 2
+    upload_max_file_size = 100 * 1024 * 1024
+    upload_max_request_size = 200 * 1024 * 1024
+
+    def post(self, request, *args, **kwargs):
+        data_file = request.FILES.get('file')
+        if data_file is None:
+            return Response({"detail": "An import `file` is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        allow_partial = str(request.data.get('partial', '')).lower() in ['1', 'true', 'yes']
+        importer = bulk_import.AdvertisementImporter(request.user)
+        try:
+            report = importer.run(
+                data_file, request.FILES.get('photos'), request.data.get('format'), allow_partial=allow_partial
+            )
+        except bulk_import.BulkImportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
+
 class AdDetail(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, Update, or Delete an Advertisement
     """
-    queryset = db.Advertisement.objects.all()
+    queryset = db.Advertisement.objects.for_listing()
     serializer_class = serializers.AdvertisementSerializer
 
     def get_object(self):
         obj = super().get_object()
         if self.request.method == 'GET':
-            obj.views += 1
-            obj.save(update_fields=['views'])
+            # Buffered and flushed in batches, so reads stay write-free
+            ad_views.record(obj.pk, self.request)
         return obj
 
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = conditional.advertisement_validators(request, self.kwargs['pk'])
+        if etag is None:
+            # Not in the live table; expired ads are still reachable by id from the archive
+            archived = archive.get_archived(self.kwargs['pk'])
+            if archived is not None:
+                return Response(serializers.ArchivedAdvertisementSerializer(archived, context=self.get_serializer_context()).data)
+        response = conditional.not_modified(request, etag, last_modified)
+        if response is not None:
+            # Still a view, even though the client already has the ad; keyed by UUID like the 200 path
+            ad_views.record(uuid.UUID(self.kwargs['pk']), request)
+            return response
+        return conditional.set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
     def get_permissions(self):
         """
         Returns the list of permissions that this view requires.
@@ -269,63 +363,300 @@ class AdDetail(generics.RetrieveUpdateDestroyAPIView):
 
         return super().get_permissions()
 
-class ProduceAdsList(generics.ListAPIView):
+class AdFull(generics.RetrieveAPIView):
+    """
+    An Advertisement with its photos, seller, review summary with the first page of reviews, and featured status.
+    Replaces the separate detail, reviews and seller calls with one response built from a fixed number of queries.
+    """
+    queryset = db.Advertisement.objects.for_listing().select_related("user")
+    serializer_class = serializers.AdvertisementFullSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        obj = super().get_object()
+        ad_views.record(obj.pk, self.request)
+        return obj
+
+    def get_review_summary(self, advertisement):
+        # Maintained on the advertisement by dashboard.ratings, so no aggregate query
+        return {
+            "count": advertisement.rating_count,
+            "average_rating": advertisement.rating_average,
+            "distribution": advertisement.rating_histogram,
+        }
+
+    def retrieve(self, request, *args, **kwargs):
+        advertisement = self.get_object()
+        summary = self.get_review_summary(advertisement)
+        pagination = ReviewPagination()
+        page_size = pagination.page_size
+        reviews = list(db.Reviews.objects.filter(advertisement=advertisement).order_by(*pagination.ordering)[:page_size])
+
+        reviews_next = None
+        if summary["count"] > page_size and reviews:
+            # Continue on the review list's cursor after the last review shown here
+            last = reviews[-1]
+            cursor = pagination.encode_cursor([last.created_on, last.id], False)
+            reviews_next = f'{reverse("review-list", args=[advertisement.pk], request=request)}?{pagination.cursor_query_param}={cursor}'
+
+        serializer = self.get_serializer(advertisement, context={
+            **self.get_serializer_context(),
+            "review_summary": summary,
+            "reviews": reviews,
+            "reviews_next": reviews_next,
+            "is_featured": featured.is_featured(advertisement.pk),
+        })
+        return Response(serializer.data)
+
+class SimilarAds(generics.ListAPIView):
+    """
+    List the Advertisements most similar to one ad by title, description and category,
+    looked up in the prebuilt TF-IDF index. At most `?limit=` ads, 10 by default.
+    """
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = None
+    max_limit = 50
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', 10))
+        except ValueError:
+            raise ParseError("Invalid limit.")
+        if not 1 <= limit <= self.max_limit:
+            raise ParseError(f"limit must be between 1 and {self.max_limit}.")
+        return limit
+
+    def get_queryset(self):
+        advertisement = generics.get_object_or_404(db.Advertisement.objects.only("id", "category_id"), pk=self.kwargs['pk'])
+        ids = similar.similar_ad_ids(advertisement, self.get_limit())
+        ads = db.Advertisement.objects.for_listing().in_bulk(ids)
+        # Ads deleted since the index was built are skipped
+        return [ads[ad_id] for ad_id in ids if ad_id in ads]
+
+class ProduceAdsList(CachedListMixin, FeaturedFeedMixin, ConditionalListMixin, generics.ListAPIView):
     """ 
     List all Farm Produce/Products Advertisements
     """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = RecentAdsPagination
+    featured_classification = db.Category.ADVERT_CLASSIFICATION.FARM_PRODUCE
+
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.FARM_PRODUCE
+        return db.Advertisement.objects.for_listing().by_classification(
+            db.Category.ADVERT_CLASSIFICATION.FARM_PRODUCE
         )
 
-class InputAdsList(generics.ListAPIView):
+class InputAdsList(CachedListMixin, FeaturedFeedMixin, ConditionalListMixin, generics.ListAPIView):
     """ List all Farm Input Advertisements """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = RecentAdsPagination
+    featured_classification = db.Category.ADVERT_CLASSIFICATION.FARM_INPUT
+
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.FARM_INPUT
+        return db.Advertisement.objects.for_listing().by_classification(
+            db.Category.ADVERT_CLASSIFICATION.FARM_INPUT
         )
     
-class ServiceAdsList(generics.ListAPIView):
+class ServiceAdsList(CachedListMixin, FeaturedFeedMixin, ConditionalListMixin, generics.ListAPIView):
     """ List all Service Advertisements """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = RecentAdsPagination
+    featured_classification = db.Category.ADVERT_CLASSIFICATION.SERVICE_LISTING
+
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.SERVICE_LISTING
+        return db.Advertisement.objects.for_listing().by_classification(
+            db.Category.ADVERT_CLASSIFICATION.SERVICE_LISTING
         )
 
-# Top ADs
-class TopProduceAds(generics.ListAPIView):
+class AdSearch(generics.ListAPIView):
+    """ Full-text search over advertisement titles and descriptions, best matches first """
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = SearchResultsPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ParseError("A search query `q` is required.")
+        return search.search(db.Advertisement.objects.for_listing(), query)
+
+class AdFilter(generics.ListAPIView):
     """
-    List the 10 most popular Farm Produce/Product Advertisements
+    Filter Advertisements by county, sub_county, category and classification.
+    Each parameter may be repeated; the page is returned with facet counts. Each facet counts
+    the advertisements matching every filter but its own, so picking one county still shows
+    how many ads the other counties would add.
     """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = RecentAdsPagination
+    filter_fields = {
+        'county': 'county__in',
+        'sub_county': 'sub_county__in',
+        'category': 'category__in',
+        'classification': 'category__classification__in',
+    }
+
+    def get_filters(self):
+        filters = {}
+        for param, lookup in self.filter_fields.items():
+            values = self.request.query_params.getlist(param)
+            if values:
+                filters[lookup] = values
+
+        if 'category__in' in filters:
+            try:
+                filters['category__in'] = [uuid.UUID(value) for value in filters['category__in']]
+            except ValueError:
+                raise ParseError("Invalid category id.")
+
+        return filters
 
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.FARM_PRODUCE
-        ).order_by('-views')[:10]
+        return db.Advertisement.objects.for_listing().filter(**self.get_filters())
 
-class TopInputAds(generics.ListAPIView):
+    def get_facets(self):
+        """
+        Facets without a filter of their own share one grouped query over the filtered set;
+        each filtered facet is counted with its own filter left out.
+        """
+        filters = self.get_filters()
+        ads = db.Advertisement.objects.all()
+        filtered = [param for param, lookup in self.filter_fields.items() if lookup in filters]
+        unfiltered = [param for param in self.filter_fields if param not in filtered]
+
+        facets = {}
+        if unfiltered:
+            facets.update(ads.filter(**filters).facet_counts(unfiltered))
+        for param in filtered:
+            others = {lookup: values for lookup, values in filters.items() if lookup != self.filter_fields[param]}
+            facets.update(ads.filter(**others).facet_counts([param]))
+        return {param: facets[param] for param in self.filter_fields}
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = self.get_facets()
+        return response
+
+class AdsNear(generics.ListAPIView):
     """
-    List the 10 most popular Farm Input Advertisements
+    List Advertisements within `radius` km (default 20, max 200) of `lat`/`lng`, nearest first
     """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.NearbyAdvertisementSerializer
+    default_radius = 20
+    max_radius = 200
+
+    def get_point(self):
+        params = self.request.query_params
+        try:
+            latitude = float(params['lat'])
+            longitude = float(params['lng'])
+            radius = float(params.get('radius', self.default_radius))
+        except (KeyError, ValueError):
+            raise ParseError("`lat` and `lng` are required and, like `radius`, must be numbers.")
+        if not geo.valid_coordinates(latitude, longitude) or not 0 < radius <= self.max_radius:
+            raise ParseError(f"Coordinates must be valid and radius between 0 and {self.max_radius} km.")
+        return latitude, longitude, radius
+
+    def list(self, request, *args, **kwargs):
+        latitude, longitude, radius = self.get_point()
+        min_lat, max_lat, min_lng, max_lng = geo.bounding_box(latitude, longitude, radius)
+
+        # Cheap indexed box first, exact distance only for the candidates inside it
+        candidates = db.Advertisement.objects.filter(
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng)
+        ).values_list('id', 'latitude', 'longitude')
+        nearby = sorted(
+            (distance, ad_id)
+            for ad_id, distance in (
+                (ad_id, geo.haversine(latitude, longitude, ad_lat, ad_lng)) for ad_id, ad_lat, ad_lng in candidates
+            )
+            if distance <= radius
+        )
+
+        page = self.paginate_queryset(nearby)
+        ads = db.Advertisement.objects.for_listing().in_bulk([ad_id for _, ad_id in page])
+        results = []
+        for distance, ad_id in page:
+            if ad_id in ads:
+                ads[ad_id].distance = round(distance, 3)
+                results.append(ads[ad_id])
+
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class TrendingAds(generics.ListAPIView):
+    """
+    List Advertisements trending now, ranked by hourly views with exponential time decay.
+    Optionally limited to one `?classification=`.
+    """
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = None
+
+    def get_classification(self):
+        classification = self.request.query_params.get('classification')
+        if classification and classification not in db.Category.ADVERT_CLASSIFICATION.values:
+            raise ParseError("Invalid classification.")
+        return classification
+
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.FARM_INPUT
-        ).order_by('-views')[:10]
+        return trending.trending_ads(self.get_classification(), db.Advertisement.objects.for_listing())
 
-class TopServiceAds(generics.ListAPIView):
+# Top ADs
+class TopAdsList(generics.ListAPIView):
     """
-    List the 10 most popular Service Advertisements
+    Base view for the Advertisements of a classification or category, most viewed first.
+    The whole set is paginated: the first page is served from the cached leaderboard, and
+    the `next` cursor seeks on (views, id) through the rest.
     """
-    serializer_class = serializers.AdvertisementSerializer
+    serializer_class = serializers.AdvertisementListSerializer
+    pagination_class = PopularAdsPagination
+    leaderboard_scope = "classification"
+    leaderboard_value = None
+
+    def get_leaderboard_value(self):
+        return self.leaderboard_value
+
     def get_queryset(self):
-        return db.Advertisement.objects.filter(
-            category__classification=db.Category.ADVERT_CLASSIFICATION.SERVICE_LISTING
-        ).order_by('-views')[:10]
+        return db.Advertisement.objects.for_listing().filter(
+            **leaderboards.scope_filter(self.leaderboard_scope, self.get_leaderboard_value())
+        )
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator.cursor_query_param in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        ads = leaderboards.top_ads(
+            self.leaderboard_scope, self.get_leaderboard_value(), db.Advertisement.objects.for_listing()
+        )
+        page = self.paginator.paginate_precomputed(ads, request, has_more=len(ads) >= self.paginator.page_size)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+class TopProduceAds(TopAdsList):
+    """
+    List Farm Produce/Product Advertisements by popularity, most viewed first, a page at a time
+    """
+    leaderboard_value = db.Category.ADVERT_CLASSIFICATION.FARM_PRODUCE
+
+class TopInputAds(TopAdsList):
+    """
+    List Farm Input Advertisements by popularity, most viewed first, a page at a time
+    """
+    leaderboard_value = db.Category.ADVERT_CLASSIFICATION.FARM_INPUT
+
+class TopServiceAds(TopAdsList):
+    """
+    List Service Advertisements by popularity, most viewed first, a page at a time
+    """
+    leaderboard_value = db.Category.ADVERT_CLASSIFICATION.SERVICE_LISTING
+
+class TopCategoryAds(TopAdsList):
+    """
+    List the Advertisements in a category by popularity, most viewed first, a page at a time
+    """
+    leaderboard_scope = "category"
+
+    def get_leaderboard_value(self):
+        return generics.get_object_or_404(db.Category, pk=self.kwargs.get('pk')).pk
     
 # User management views.
 class UserList(generics.ListAPIView):
@@ -499,7 +830,7 @@ class Login(LoginView):
 
    
 class Logout(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
@@ -526,7 +857,7 @@ class Logout(APIView):
         return Response({"detail": "This endpoint only accepts POST requests for logout."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 class LogoutAll(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
@@ -712,7 +1043,7 @@ class Payments(generics.ListAPIView):
         return Response(serializer.data)
 
 # Mail
-class MailViewSet(viewsets.ViewSet):
+class MailViewSet(UploadLimitMixin, viewsets.ViewSet):
     User = get_user_model()
     permission_classes = [IsAdminUser]
 
@@ -770,7 +1101,7 @@ class MailViewSet(viewsets.ViewSet):
 
         except Exception as e:
             for attachment in attachment_objects:
-                default_storage.delete(attachment.file.name)
+                default_storage.discard_unsaved(attachment.file.name)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def list(self, request):
@@ -794,7 +1125,7 @@ class MailViewSet(viewsets.ViewSet):
                 return Response({"error": "Mail not found"}, status=status.HTTP_404_NOT_FOUND)
 
         attachments = db.MailAttachment.objects.filter(content_type=ContentType.objects.get_for_model(mail), object_id=mail.id)
-        attachment_data = [{"id": att.id, "filename": att.file.name} for att in attachments]
+        attachment_data = [{"id": att.id, "filename": att.display_name} for att in attachments]
 
         data = {
             "id": mail.id,
@@ -900,17 +1231,19 @@ class MailViewSet(viewsets.ViewSet):
     def create_attachments(self, mail, attachments):
         attachment_objects = []
         for attachment in attachments:
-            file_name = default_storage.get_available_name(attachment.name)
-            file_path = default_storage.save(f'mail_attachments/{file_name}', ContentFile(attachment.read()))
+            # Saved straight from the upload so it is hashed and written in chunks
+            file_path = default_storage.save(f'mail_attachments/{attachment.name}', attachment)
             attachment_obj = db.MailAttachment.objects.create(
                 content_object=mail,
-                file=file_path
+                file=file_path,
+                filename=os.path.basename(attachment.name)
             )
             attachment_objects.append(attachment_obj)
         return attachment_objects
 
     def send_emails(self, from_email, recipients, subject, message, attachments):
-        attachment_paths = [attachment.file.path for attachment in attachments]
+        # Sent under the uploaded names, not the content-hash names they are stored under
+        attachment_paths = [(attachment.file.path, attachment.display_name) for attachment in attachments]
         failed_recipients = []
         for recipient in recipients:
             try:
@@ -930,15 +1263,37 @@ class ReviewCreateView(generics.CreateAPIView):
         advertisement = serializer.validated_data['advertisement']
         if advertisement.user == self.request.user:
             raise PermissionDenied("You cannot review your own advertisement.")
-        serializer.save()
+        with transaction.atomic():
+            review = serializer.save()
+            ratings.record(review.advertisement_id, review.rating)
 
 class ReviewListView(generics.ListAPIView):
+    """
+    List an Advertisement's reviews, newest first, optionally only one `?rating=`.
+    Pages follow a (created_on, id) cursor, so deep pages cost the same as the first.
+    """
     serializer_class = serializers.ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReviewPagination
+
+    def get_rating(self):
+        rating = self.request.query_params.get('rating')
+        if rating is None:
+            return None
+        try:
+            rating = int(rating)
+        except ValueError:
+            raise ParseError("Invalid rating.")
+        if rating not in db.Reviews.RatingChoices.values:
+            raise ParseError("Invalid rating.")
+        return rating
 
     def get_queryset(self):
-        advertisement_id = self.kwargs.get('advertisement_id')
-        return db.Reviews.objects.filter(advertisement_id=advertisement_id)
+        reviews = db.Reviews.objects.filter(advertisement_id=self.kwargs.get('advertisement_id'))
+        rating = self.get_rating()
+        if rating is not None:
+            reviews = reviews.filter(rating=rating)
+        return reviews
     
 # Groups and permissions
 class GroupViewSet(viewsets.ModelViewSet):
@@ -1230,17 +1585,25 @@ def api_root(request, format=None):
         'classifications': reverse("classifications", request=request, format=format),
         'categories': reverse("categories", request=request, format=format ),
         'category-detail': reverse("category-detail", args=['pk'],request=request, format=format ),
+        'category-children': reverse("category-children", args=['pk'],request=request, format=format ),
         'new-category': reverse("new-category", request=request, format=format ),
         
         # ADs
         'ads': reverse("ads", request=request, format=format),
         'user-ads': reverse("user-ads", request=request, format=format),
         'new-ad': reverse("new-ad", request=request, format=format ),
+        'import-ads': reverse("import-ads", request=request, format=format ),
         'ad-detail': reverse("ad-detail", args=['pk'],request=request, format=format),
+        'ad-full': reverse("ad-full", args=['pk'],request=request, format=format),
+        'similar-ads': reverse("similar-ads", args=['pk'],request=request, format=format),
         
         'produce-ads':reverse("produce-ads", request=request, format=format),
         'input-ads': reverse("input-ads", request=request, format=format),
         'service-ads':reverse("service-ads", request=request, format=format),
+        'search-ads': reverse("search-ads", request=request, format=format),
+        'filter-ads': reverse("filter-ads", request=request, format=format),
+        'trending-ads': reverse("trending-ads", request=request, format=format),
+        'ads-near': reverse("ads-near", request=request, format=format),
         
         #'produce-ads-detail':reverse("produce-ads-detail", request=request, format=format), 
         #'input-ads-detail': reverse("input-ads-detail", request=request, format=format),
@@ -1248,7 +1611,8 @@ def api_root(request, format=None):
         
         'top-produce': reverse('top-produce-ads', request=request, format=format),
         'top-inputs': reverse('top-input-ads', request=request, format=format),
-        'top-services': reverse('top-service-ads', request=request, format=format),        
+        'top-services': reverse('top-service-ads', request=request, format=format),
+        'top-category': reverse('top-category-ads', args=['pk'], request=request, format=format),        
         
         # Reviews
         'reviews': reverse('review-list', args=['advertisement_id'], request=request, format=format),
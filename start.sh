@@ -4,6 +4,7 @@ cd api
 # Run migrations
 python3 manage.py makemigrations
 python3 manage.py migrate
+python3 manage.py createcachetable
 
 # Seed Database
 #python3 manage.py loaddata superusers.json
@@ -1,12 +1,15 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from dashboard.models import (
     CustomUser, Category, CategoryRelation, Advertisement, AdvertisementPhoto,
     Reviews, SubscriptionPackage, Offering, PaymentMethods, Payment, Subscription,
-    FeaturedAdvertisement, IndividualMail, BulkMail, MailAttachment
+    FeaturedAdvertisement, IndividualMail, BulkMail, MailAttachment, MediaBlob
 )
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+import os
 import uuid
 from datetime import datetime, timedelta
 
@@ -454,4 +457,70 @@ class MailAttachmentTests(TestCase):
 
     def test_mail_attachment_creation(self):
         self.assertEqual(self.mail_attachment.content_object, self.individual_mail)
-        self.assertEqual(self.mail_attachment.file, 'path/to/file.txt')
\ No newline at end of file
+        self.assertEqual(self.mail_attachment.file, 'path/to/file.txt')
+
+class DeduplicatingStorageTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            first_name='John', last_name='Doe', email='john.doe@example.com', phone='0712345678', password='password123'
+        )
+        category = Category.objects.create(name='Fruits', classification='FP')
+        self.advertisement = Advertisement.objects.create(
+            user=self.user, category=category, title='Mangoes', description='Ripe',
+            county='Nakuru', sub_county='Njoro'
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('a.jpg', b'same photo'))
+        second = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('b.jpg', b'same photo'))
+        other = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('c.jpg', b'other photo'))
+
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertNotEqual(first.photo.name, other.photo.name)
+        self.assertTrue(first.photo.name.startswith('ad-images/'))
+        self.assertEqual(MediaBlob.objects.get(name=first.photo.name).refcount, 2)
+
+    def test_file_removed_with_last_reference(self):
+        first = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('a.jpg', b'shared'))
+        second = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('b.jpg', b'shared'))
+        name, storage = first.photo.name, first.photo.storage
+
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_rolled_back_delete_keeps_file(self):
+        photo = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('a.jpg', b'kept'))
+        name, storage = photo.photo.name, photo.photo.storage
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                photo.delete()
+                raise RuntimeError("rolled back")
+        self.assertEqual(callbacks, [])
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_missing_file_rewritten_for_existing_references(self):
+        first = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('a.jpg', b'lost'))
+        name, storage = first.photo.name, first.photo.storage
+        os.remove(storage.path(name))
+
+        second = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('b.jpg', b'lost'))
+        self.assertEqual(second.photo.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+    def test_mail_attachments_shared_with_photos(self):
+        photo = AdvertisementPhoto.objects.create(advert=self.advertisement, photo=SimpleUploadedFile('a.jpg', b'price list'))
+        mail = IndividualMail.objects.create(sender=self.user, recipient='a@example.com', message='Hi')
+        attachment = MailAttachment(content_object=mail)
+        attachment.file.save('prices.jpg', SimpleUploadedFile('prices.jpg', b'price list'))
+
+        self.assertEqual(attachment.file.name, photo.photo.name)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
@@ -1,6 +1,8 @@
 import unittest
 from rest_framework.exceptions import ValidationError
 from dashboard.utils.utils import CustomValidators, NormalizeData
+from dashboard.utils.geo import parse_coordinates, haversine, bounding_box
+from dashboard.utils.minhash import band_hashes, from_bytes, signature, similarity, to_bytes
 
 class CustomValidatorsTests(unittest.TestCase):
 
@@ -54,5 +56,53 @@ class NormalizeDataTests(unittest.TestCase):
             self.assertEqual(self.normalizer.normalize_phone_number(input_number), expected_output,
                              f"Failed for input: {input_number}")
 
+class GeoTests(unittest.TestCase):
+
+    def test_parse_coordinates(self):
+        test_cases = {
+            'https://www.google.com/maps/place/Nakuru/@-0.3031,36.0800,13z/data=!3m1!4b1!3d-0.3031!4d36.0801': (-0.3031, 36.0801),
+            'https://www.google.com/maps/@-1.2921,36.8219,15z': (-1.2921, 36.8219),
+            'https://maps.google.com/?q=-1.2921,36.8219': (-1.2921, 36.8219),
+            'https://www.google.com/maps/search/?api=1&query=-1.2921%2C36.8219': (-1.2921, 36.8219),
+            'https://www.openstreetmap.org/?mlat=-0.4167&mlon=36.9500#map=12/-0.4167/36.9500': (-0.4167, 36.95),
+            'https://www.openstreetmap.org/#map=12/-0.4167/36.9500': (-0.4167, 36.95),
+            'geo:-1.2921,36.8219': (-1.2921, 36.8219),
+        }
+        for url, expected in test_cases.items():
+            self.assertEqual(parse_coordinates(url), expected, f"Failed for url: {url}")
+
+    def test_parse_coordinates_without_location(self):
+        for url in ['', None, 'https://goo.gl/maps/abc123', 'https://maps.google.com/?q=Nakuru', 'geo:95,10']:
+            self.assertIsNone(parse_coordinates(url), f"Failed for url: {url}")
+
+    def test_haversine(self):
+        # Nairobi to Nakuru is about 137 km as the crow flies
+        self.assertAlmostEqual(haversine(-1.2921, 36.8219, -0.3031, 36.0800), 137.5, delta=2)
+        self.assertEqual(haversine(-1.2921, 36.8219, -1.2921, 36.8219), 0)
+
+    def test_bounding_box_contains_radius(self):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(-1.2921, 36.8219, 20)
+        self.assertAlmostEqual(haversine(-1.2921, 36.8219, max_lat, 36.8219), 20, delta=0.1)
+        self.assertAlmostEqual(haversine(-1.2921, 36.8219, -1.2921, max_lng), 20, delta=0.1)
+        self.assertLess(min_lat, -1.2921)
+        self.assertLess(min_lng, 36.8219)
+
+class MinHashTests(unittest.TestCase):
+
+    def test_similar_text_scores_high(self):
+        text = "Fresh ripe mangoes from Njoro farm, sold per crate. Call for delivery within Nakuru."
+        repost = "Fresh ripe mangoes from Njoro farm, sold per crate! Call for delivery within Nakuru town."
+        other = "Tractor ploughing services available for hire in Molo, booking by the acre."
+        self.assertGreater(similarity(signature(text), signature(repost)), 0.7)
+        self.assertLess(similarity(signature(text), signature(other)), 0.2)
+
+    def test_signature_round_trip(self):
+        sig = signature("Dairy cows for sale")
+        self.assertEqual(from_bytes(to_bytes(sig)), sig)
+        self.assertEqual(len(to_bytes(sig)), 256)
+
+    def test_identical_text_shares_every_band(self):
+        self.assertEqual(band_hashes(signature("Hass avocados")), band_hashes(signature("hass  AVOCADOS")))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,1564 @@
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from knox.models import AuthToken
+from PIL import Image
+
+from dashboard.models import (
+    CustomUser, Category, Advertisement, AdvertisementPhoto, AdvertisementViewBucket, Reviews,
+    SubscriptionPackage, Payment, Subscription, FeaturedAdvertisement, AdvertisementFingerprint,
+    ArchivedAdvertisement, ArchivedAdvertisementPhoto, IndividualMail, MediaBlob
+)
+from dashboard import archive, authentication, duplicates, featured, leaderboards, ratings, response_cache, search, similar, trending
+from dashboard.pagination import RecentAdsPagination, SearchResultsPagination
+from dashboard.views import MailViewSet
+from dashboard.utils import bulk_import
+from dashboard.utils.counters import AdViewCounter, ad_views
+
+
+# Query counting tests run against a cache outside the database, as with CACHE_URL=redis://...
+# The default dbcache backend turns every cache read, write and view dedup key into SQL.
+NON_DB_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def view_queries(context):
+    """Captured queries of the view itself, leaving out the traffic middleware's inserts"""
+    return [
+        q for q in context.captured_queries
+        if not any(table in q['sql'] for table in ('sitevisit', 'pagevisit'))
+        and not q['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
+    ]
+
+
+class CategoryTreeViewTests(APITestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="Root", classification="FP")
+        self.child = Category.objects.create(name="Child", classification="FP", parent=self.root)
+        self.leaf = Category.objects.create(name="Leaf", classification="FP", parent=self.child)
+
+    def test_category_list_full_tree(self):
+        response = self.client.get(reverse('categories'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        root = response.data['results'][0]
+        self.assertEqual(root['sub_categories'][0]['sub_categories'][0]['name'], "Leaf")
+
+    def test_category_list_depth(self):
+        response = self.client.get(reverse('categories'), {'depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        root = response.data['results'][0]
+        self.assertEqual(root['sub_categories'][0]['name'], "Child")
+        self.assertEqual(root['sub_categories'][0]['sub_categories'], [])
+
+        response = self.client.get(reverse('categories'), {'depth': 0})
+        self.assertEqual(response.data['results'][0]['sub_categories'], [])
+
+    def test_category_list_invalid_depth(self):
+        response = self.client.get(reverse('categories'), {'depth': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_category_children(self):
+        response = self.client.get(reverse('category-children', args=[self.root.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], "Child")
+        self.assertEqual(response.data['results'][0]['child_count'], 1)
+
+        response = self.client.get(reverse('category-children', args=[self.leaf.id]))
+        self.assertEqual(response.data['results'], [])
+
+    def test_category_children_unknown_category(self):
+        response = self.client.get(reverse('category-children', args=['not-a-uuid']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AdListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.produce = Category.objects.create(name="Fruits", classification="FP")
+        self.service = Category.objects.create(name="Ploughing", classification="SL")
+        cache.clear()
+        featured.rebuild()
+
+    def create_ads(self, category, count):
+        for i in range(count):
+            ad = Advertisement.objects.create(
+                user=self.user, category=category, title=f"Ad {i}", description="Fresh",
+                county="Nakuru", sub_county="Njoro"
+            )
+            AdvertisementPhoto.objects.create(advert=ad, photo=SimpleUploadedFile(f"ad{i}.jpg", b""))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), response
+
+    def assert_constant_queries(self, url, category):
+        self.create_ads(category, 2)
+        small, _ = self.count_queries(url)
+        self.create_ads(category, 18)
+        full, response = self.count_queries(url)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(small, full)
+
+    def test_produce_ads_constant_queries(self):
+        self.assert_constant_queries(reverse('produce-ads'), self.produce)
+
+    def test_service_ads_constant_queries(self):
+        self.assert_constant_queries(reverse('service-ads'), self.service)
+
+    def test_top_produce_ads_constant_queries(self):
+        self.create_ads(self.produce, 2)
+        small, _ = self.count_queries(reverse('top-produce-ads'))
+        self.create_ads(self.produce, 10)
+        full, response = self.count_queries(reverse('top-produce-ads'))
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small, full)
+
+    def test_user_ads_constant_queries(self):
+        self.client.force_authenticate(self.user)
+        self.assert_constant_queries(reverse('user-ads'), self.produce)
+
+
+class AdDetailViewCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        self.owner = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.viewer = CustomUser.objects.create_user(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="0712345679", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.owner, category=category, title="Mangoes", description="Fresh",
+            county="Nakuru", sub_county="Njoro"
+        )
+        self.url = reverse('ad-detail', args=[self.ad.id])
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def test_get_does_not_write(self):
+        self.client.force_authenticate(self.viewer)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "dashboard_advertisement"') for query in context.captured_queries
+        ))
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 0)
+        self.assertEqual(ad_views.pending_views(self.ad.id), 1)
+
+    def test_flush_applies_deduplicated_views(self):
+        self.client.force_authenticate(self.viewer)
+        self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+        self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+        self.client.force_authenticate(self.owner)
+        self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+
+        self.assertEqual(ad_views.flush(), {self.ad.id: 2})
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views, 2)
+
+    def test_bot_views_are_ignored(self):
+        self.client.force_authenticate(self.viewer)
+        self.client.get(self.url, HTTP_USER_AGENT="Googlebot/2.1")
+        self.assertEqual(ad_views.pending_views(self.ad.id), 0)
+
+    def test_background_thread_flushes(self):
+        counter = AdViewCounter(flush_interval=0.01)
+        request = RequestFactory().get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+        request.user = self.viewer
+        flushed = threading.Event()
+        with mock.patch.object(counter, 'flush', side_effect=flushed.set):
+            self.assertTrue(counter.record(self.ad.id, request))
+            self.assertEqual(counter.pending_views(self.ad.id), 1)
+            self.assertTrue(flushed.wait(timeout=5))
+        counter.stopped.set()
+        counter.flusher.join(timeout=5)
+
+
+class AdKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        for i in range(25):
+            Advertisement.objects.create(
+                user=user, category=category, title=f"Ad {i}", description="Fresh",
+                county="Nakuru", sub_county="Njoro", views=i % 5
+            )
+
+    def collect(self, url):
+        ids = []
+        previous = None
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(ad['id'] for ad in response.data['results'])
+            previous = response.data['previous']
+            url = response.data['next']
+        return ids, previous
+
+    def test_recent_feed_walks_every_ad_once(self):
+        ids, previous = self.collect(reverse('produce-ads'))
+        expected = [str(pk) for pk in Advertisement.objects.order_by('-created_on', '-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+
+        response = self.client.get(previous)
+        self.assertEqual([ad['id'] for ad in response.data['results']], expected[:20])
+
+    def test_popular_feed_orders_by_views(self):
+        ids, _ = self.collect(reverse('top-produce-ads'))
+        expected = [str(pk) for pk in Advertisement.objects.order_by('-views', '-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('produce-ads'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AdSearchTests(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.mangoes = Advertisement.objects.create(
+            user=user, category=category, title="Fresh mangoes", description="Sweet mangoes from Makueni",
+            county="Makueni", sub_county="Wote"
+        )
+        self.avocado = Advertisement.objects.create(
+            user=user, category=category, title="Hass avocado", description="Export grade, pairs well with mangoes",
+            county="Murang'a", sub_county="Kandara"
+        )
+        Advertisement.objects.create(
+            user=user, category=category, title="Tractor hire", description="Ploughing services",
+            county="Nakuru", sub_county="Njoro"
+        )
+
+    def test_search_ranks_matches(self):
+        response = self.client.get(reverse('search-ads'), {'q': 'mangoes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [ad['id'] for ad in response.data['results']]
+        self.assertEqual(ids, [str(self.mangoes.id), str(self.avocado.id)])
+
+    def test_search_cursor_walks_every_match_once(self):
+        user = self.mangoes.user
+        for i in range(3):
+            Advertisement.objects.create(
+                user=user, category=self.mangoes.category, title="Ripe mangoes", description="Sweet mangoes",
+                county="Nakuru", sub_county="Njoro"
+            )
+        matches = search.search(Advertisement.objects.all(), 'mangoes').order_by('-rank', '-id')
+        self.assertTrue(all(isinstance(rank, int) for rank in matches.values_list('rank', flat=True)))
+        expected = list(matches.values_list('id', flat=True))
+
+        ids, url = [], reverse('search-ads') + '?q=mangoes'
+        with mock.patch.object(SearchResultsPagination, 'page_size', 2):
+            while url:
+                response = self.client.get(url)
+                ids += [uuid.UUID(ad['id']) for ad in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(ids, expected)
+
+    def test_search_index_follows_updates(self):
+        self.avocado.title = "Hass avocado and pawpaw"
+        self.avocado.save()
+        response = self.client.get(reverse('search-ads'), {'q': 'pawpaw'})
+        self.assertEqual([ad['id'] for ad in response.data['results']], [str(self.avocado.id)])
+
+        self.avocado.delete()
+        response = self.client.get(reverse('search-ads'), {'q': 'pawpaw'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_search_requires_query(self):
+        response = self.client.get(reverse('search-ads'), {'q': ' '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdFilterTests(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.fruits = Category.objects.create(name="Fruits", classification="FP")
+        self.ploughing = Category.objects.create(name="Ploughing", classification="SL")
+        for county, sub_county, category in [
+            ("Nakuru", "Njoro", self.fruits),
+            ("Nakuru", "Molo", self.fruits),
+            ("Nakuru", "Njoro", self.ploughing),
+            ("Kiambu", "Thika", self.fruits),
+        ]:
+            Advertisement.objects.create(
+                user=user, category=category, title="Ad", description="Ad",
+                county=county, sub_county=sub_county
+            )
+
+    def facet(self, response, name):
+        return {item['value']: item['count'] for item in response.data['facets'][name]}
+
+    def test_filter_with_facets(self):
+        response = self.client.get(reverse('filter-ads'), {'county': 'Nakuru'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        # The county facet ignores the county filter, so the other counties stay selectable
+        self.assertEqual(self.facet(response, 'county'), {'Nakuru': 3, 'Kiambu': 1})
+        self.assertEqual(self.facet(response, 'sub_county'), {'Njoro': 2, 'Molo': 1})
+        self.assertEqual(self.facet(response, 'category'), {self.fruits.id: 2, self.ploughing.id: 1})
+        self.assertEqual(self.facet(response, 'classification'), {'FP': 2, 'SL': 1})
+
+    def test_filter_repeated_values(self):
+        response = self.client.get(
+            reverse('filter-ads'), {'sub_county': ['Njoro', 'Thika'], 'classification': 'FP'}
+        )
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.facet(response, 'county'), {'Nakuru': 1, 'Kiambu': 1})
+        self.assertEqual(self.facet(response, 'sub_county'), {'Njoro': 1, 'Molo': 1, 'Thika': 1})
+        self.assertEqual(self.facet(response, 'classification'), {'FP': 2, 'SL': 1})
+
+    def test_filter_invalid_category(self):
+        response = self.client.get(reverse('filter-ads'), {'category': 'not-a-uuid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TopAdsLeaderboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.inputs = Category.objects.create(name="Fertiliser", classification="FI")
+        self.ads = [
+            Advertisement.objects.create(
+                user=self.user, category=self.inputs, title=f"Ad {i}", description="Ad",
+                county="Nakuru", sub_county="Njoro", views=i
+            )
+            for i in range(12)
+        ]
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def result_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [ad['id'] for ad in response.data['results']]
+
+    def test_top_input_ads(self):
+        ids = self.result_ids(reverse('top-input-ads'))
+        self.assertEqual(ids, [str(ad.id) for ad in reversed(self.ads[2:])])
+
+    def test_leaderboard_served_from_cache(self):
+        url = reverse('top-category-ads', args=[self.inputs.id])
+        self.result_ids(url)
+        with CaptureQueriesContext(connection) as context:
+            self.result_ids(url)
+        self.assertFalse(any('ORDER BY' in query['sql'] and 'LIMIT 10' in query['sql'] for query in context.captured_queries))
+
+    def test_flushed_views_update_leaderboard(self):
+        url = reverse('top-input-ads')
+        self.result_ids(url)
+
+        viewer = CustomUser.objects.create_user(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="0712345679", password="password123"
+        )
+        self.client.force_authenticate(viewer)
+        Advertisement.objects.filter(pk=self.ads[0].pk).update(views=20)
+        self.client.get(reverse('ad-detail', args=[self.ads[0].id]), HTTP_USER_AGENT="Mozilla/5.0")
+        ad_views.flush()
+
+        self.assertEqual(self.result_ids(url)[0], str(self.ads[0].id))
+
+    def test_flush_drops_only_reordered_boards(self):
+        self.result_ids(reverse('top-input-ads'))
+        board_key = leaderboards.cache_key("classification", Category.ADVERT_CLASSIFICATION.FARM_INPUT)
+        self.assertIsNotNone(cache.get(board_key))
+
+        # Still below the board's last entry: the cached board stays
+        leaderboards.apply_view_deltas({self.ads[0].id: 1})
+        self.assertIsNotNone(cache.get(board_key))
+
+        Advertisement.objects.filter(pk=self.ads[0].pk).update(views=20)
+        leaderboards.apply_view_deltas({self.ads[0].id: 19})
+        self.assertIsNone(cache.get(board_key))
+
+    def test_unknown_category(self):
+        response = self.client.get(reverse('top-category-ads', args=['not-a-uuid']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TrendingAdsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        fruits = Category.objects.create(name="Fruits", classification="FP")
+        ploughing = Category.objects.create(name="Ploughing", classification="SL")
+        self.old_favourite, self.rising, self.service = [
+            Advertisement.objects.create(
+                user=user, category=category, title=title, description="Ad",
+                county="Nakuru", sub_county="Njoro", views=1000 if title == "Old favourite" else 0
+            )
+            for title, category in [("Old favourite", fruits), ("Rising", fruits), ("Tractor", ploughing)]
+        ]
+        hour = trending.current_hour()
+        AdvertisementViewBucket.objects.create(advertisement=self.old_favourite, hour=hour - timedelta(hours=30), views=50)
+        AdvertisementViewBucket.objects.create(advertisement=self.rising, hour=hour, views=10)
+        AdvertisementViewBucket.objects.create(advertisement=self.service, hour=hour - timedelta(hours=1), views=5)
+        AdvertisementViewBucket.objects.create(advertisement=self.service, hour=hour - timedelta(hours=100), views=500)
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def result_ids(self, **params):
+        response = self.client.get(reverse('trending-ads'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [ad['id'] for ad in response.data]
+
+    def test_recent_views_outrank_old_ones(self):
+        self.assertEqual(
+            self.result_ids(), [str(self.rising.id), str(self.service.id), str(self.old_favourite.id)]
+        )
+        # Buckets outside the window are pruned on rebuild
+        self.assertEqual(AdvertisementViewBucket.objects.filter(advertisement=self.service).count(), 1)
+
+    def test_classification_filter(self):
+        self.assertEqual(self.result_ids(classification='SL'), [str(self.service.id)])
+        response = self.client.get(reverse('trending-ads'), {'classification': 'XX'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_flushed_views_fill_buckets_and_scores(self):
+        trending.rebuild_scores()
+        trending.record_view_deltas({self.old_favourite.id: 100})
+        bucket = AdvertisementViewBucket.objects.get(advertisement=self.old_favourite, hour=trending.current_hour())
+        self.assertEqual(bucket.views, 100)
+        self.assertEqual(self.result_ids()[0], str(self.old_favourite.id))
+
+    def test_flushes_do_not_postpone_rebuild(self):
+        trending.rebuild_scores(timezone.now() - timedelta(seconds=trending.SCORES_TTL + 60))
+        expired = AdvertisementViewBucket.objects.create(
+            advertisement=self.rising, hour=trending.current_hour() - timedelta(hours=trending.WINDOW_HOURS + 1), views=1
+        )
+        trending.record_view_deltas({self.rising.id: 1})
+
+        self.result_ids()
+        self.assertFalse(AdvertisementViewBucket.objects.filter(pk=expired.pk).exists())
+
+    def test_concurrent_flushes_keep_every_view(self):
+        now = timezone.now()
+        before = trending.rebuild_scores(now)
+        stale = cache.get(trending.SCORES_KEY)
+        # Two workers flush after both read the same scores; neither may write its copy back over the other's
+        with mock.patch.object(trending.cache, 'get', return_value=stale):
+            trending.record_view_deltas({self.old_favourite.id: 100}, now)
+            trending.record_view_deltas({self.service.id: 200}, now)
+        self.assertIsNone(cache.get(trending.SCORES_KEY))
+
+        scores = trending.rebuild_scores(now)
+        flushed = trending.decayed(1, trending.current_hour(now), now)
+        self.assertAlmostEqual(scores[self.old_favourite.id][0], before[self.old_favourite.id][0] + 100 * flushed)
+        self.assertAlmostEqual(scores[self.service.id][0], before[self.service.id][0] + 200 * flushed)
+
+
+class AdsNearTests(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ads = {}
+        for title, geo_location in [
+            ("Westlands", "https://www.google.com/maps/@-1.2676,36.8108,15z"),
+            ("CBD", "https://maps.google.com/?q=-1.2864,36.8172"),
+            ("Nakuru", "https://www.google.com/maps/@-0.3031,36.0800,13z"),
+            ("Unknown", ""),
+        ]:
+            self.ads[title] = Advertisement.objects.create(
+                user=user, category=category, title=title, description="Ad",
+                county="Nairobi", sub_county="Westlands", geo_location=geo_location
+            )
+
+    def test_coordinates_parsed_on_save(self):
+        ad = self.ads["CBD"]
+        self.assertEqual((ad.latitude, ad.longitude), (-1.2864, 36.8172))
+        ad.geo_location = "geo:-0.3031,36.0800"
+        ad.save(update_fields=["geo_location"])
+        ad.refresh_from_db()
+        self.assertEqual((ad.latitude, ad.longitude), (-0.3031, 36.08))
+
+    def test_ads_near_sorted_by_distance(self):
+        response = self.client.get(reverse('ads-near'), {'lat': -1.2921, 'lng': 36.8219, 'radius': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = [ad['title'] for ad in response.data['results']]
+        self.assertEqual(titles, ["CBD", "Westlands"])
+        self.assertLess(response.data['results'][0]['distance'], response.data['results'][1]['distance'])
+
+    def test_ads_near_invalid_params(self):
+        for params in [{}, {'lat': 'x', 'lng': 36}, {'lat': -1.29, 'lng': 36.82, 'radius': 0}, {'lat': 91, 'lng': 36}]:
+            response = self.client.get(reverse('ads-near'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_backfill_command(self):
+        Advertisement.objects.update(latitude=None, longitude=None)
+        call_command('backfill_ad_coordinates', stdout=StringIO())
+        self.assertEqual(Advertisement.objects.filter(latitude__isnull=False).count(), 3)
+
+
+class BulkAdImportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.category = Category.objects.create(name="Fruits", classification="FP")
+        self.client.force_authenticate(self.user)
+
+    def image_bytes(self, color=(200, 120, 0)):
+        output = io.BytesIO()
+        Image.new("RGB", (8, 8), color).save(output, "PNG")
+        return output.getvalue()
+
+    def photos_zip(self, *names, content=None):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name in names:
+                archive.writestr(name, content if content is not None else self.image_bytes())
+        return SimpleUploadedFile("photos.zip", buffer.getvalue(), content_type="application/zip")
+
+    def import_with_photos(self, photos):
+        csv_file = SimpleUploadedFile("ads.csv", (
+            "category,title,description,county,sub_county,photos\n"
+            f"{self.category.pk},Mangoes,Ripe mangoes,Nakuru,Njoro,a.jpg\n"
+        ).encode())
+        return self.client.post(reverse('import-ads'), {'file': csv_file, 'photos': photos})
+
+    def test_csv_import_with_photos(self):
+        csv_file = SimpleUploadedFile("ads.csv", (
+            "category,title,description,county,sub_county,geo_location,photos\n"
+            f"{self.category.pk},Mangoes,Ripe mangoes,Nakuru,Njoro,https://www.google.com/maps?q=-0.3031%2C36.0800,a.jpg;b.jpg\n"
+            f"{self.category.pk},Avocados,Hass avocados,Nakuru,Molo,,\n"
+        ).encode())
+        response = self.client.post(reverse('import-ads'), {'file': csv_file, 'photos': self.photos_zip("a.jpg", "b.jpg")})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        mangoes = Advertisement.objects.get(title="Mangoes")
+        self.assertEqual(mangoes.advertisement_photos.count(), 2)
+        self.assertEqual((mangoes.latitude, mangoes.longitude), (-0.3031, 36.08))
+
+        response = self.client.get(reverse('search-ads'), {'q': 'mango'})
+        self.assertEqual([ad['title'] for ad in response.data['results']], ["Mangoes"])
+
+    def test_photos_must_be_images(self):
+        response = self.import_with_photos(self.photos_zip("a.jpg", content=b"not an image"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['errors']['photos'], ["Not an image: a.jpg"])
+        self.assertFalse(Advertisement.objects.exists())
+
+    @mock.patch('dashboard.utils.bulk_import.MAX_PHOTO_SIZE', 16)
+    def test_photo_size_capped(self):
+        response = self.import_with_photos(self.photos_zip("a.jpg"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Advertisement.objects.exists())
+
+    @mock.patch('dashboard.utils.bulk_import.MAX_PHOTOS', 1)
+    def test_photo_count_capped(self):
+        response = self.import_with_photos(self.photos_zip("a.jpg", "b.jpg"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Advertisement.objects.exists())
+
+    def test_failed_import_does_not_delete_a_shared_photo(self):
+        ad = Advertisement.objects.create(
+            user=self.user, category=self.category, title="Oranges", description="Oranges", county="Nakuru", sub_county="Njoro"
+        )
+        shared = AdvertisementPhoto.objects.create(advert=ad, photo=SimpleUploadedFile("orange.png", self.image_bytes()))
+        storage = shared.photo.storage
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("a.jpg", self.image_bytes())
+            archive.writestr("b.jpg", self.image_bytes((0, 120, 200)))
+        csv_file = SimpleUploadedFile("ads.csv", (
+            "category,title,description,county,sub_county,photos\n"
+            f"{self.category.pk},Mangoes,Ripe mangoes,Nakuru,Njoro,a.jpg;b.jpg\n"
+        ).encode())
+
+        importer = bulk_import.AdvertisementImporter(self.user)
+        with mock.patch.object(duplicates, 'index_bulk', side_effect=RuntimeError("boom")), self.assertRaises(RuntimeError):
+            importer.run(csv_file, SimpleUploadedFile("photos.zip", buffer.getvalue()))
+
+        self.assertTrue(storage.exists(shared.photo.name))
+        self.assertEqual(list(MediaBlob.objects.values_list("name", "refcount")), [(shared.photo.name, 1)])
+        # The file only this import wrote is gone too
+        new_hash = storage.content_hash(SimpleUploadedFile("b.jpg", self.image_bytes((0, 120, 200))))
+        self.assertFalse(storage.exists(f"ad-images/{new_hash}.jpg"))
+
+    def test_json_import(self):
+        rows = [{"category": str(self.category.pk), "title": "Beans", "description": "Dry beans",
+                 "county": "Nakuru", "sub_county": "Njoro", "geo_location": ""}]
+        json_file = SimpleUploadedFile("ads.json", json.dumps(rows).encode())
+        response = self.client.post(reverse('import-ads'), {'file': json_file})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Advertisement.objects.get(pk=response.data['ids'][0]).user, self.user)
+
+    def invalid_rows(self):
+        rows = [
+            {"category": str(self.category.pk), "title": "Beans", "description": "Dry beans", "county": "Nakuru", "sub_county": "Njoro"},
+            {"category": str(uuid.uuid4()), "title": "Peas", "description": "Peas", "county": "Nakuru", "sub_county": "Njoro"},
+            {"category": str(self.category.pk), "title": "Maize", "description": "Maize", "county": "Nakuru",
+             "sub_county": "Njoro", "photos": ["missing.jpg"]},
+        ]
+        return SimpleUploadedFile("ads.json", json.dumps(rows).encode())
+
+    def test_import_is_all_or_nothing(self):
+        response = self.client.post(reverse('import-ads'), {'file': self.invalid_rows()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertFalse(Advertisement.objects.exists())
+
+    def test_partial_import(self):
+        response = self.client.post(reverse('import-ads'), {'file': self.invalid_rows(), 'partial': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(len(response.data['errors']), 2)
+
+    def test_non_utf8_csv_rejected(self):
+        csv_file = SimpleUploadedFile("ads.csv", (
+            "category,title,description,county,sub_county\n"
+            f"{self.category.pk},Café beans,Crème coffee,Murang'a,Kandara\n"
+        ).encode("latin-1"))
+        response = self.client.post(reverse('import-ads'), {'file': csv_file})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("UTF-8", response.data['detail'])
+
+    def test_malformed_csv_rejected(self):
+        # A field over the csv module's size limit
+        csv_file = SimpleUploadedFile("ads.csv", b"category,title\n\"" + b"x" * 200000 + b"\",Beans\n")
+        response = self.client.post(reverse('import-ads'), {'file': csv_file})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data['detail'].startswith("Invalid CSV"))
+
+    def test_unsupported_file(self):
+        response = self.client.post(reverse('import-ads'), {'file': SimpleUploadedFile("ads.txt", b"title")})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_command(self):
+        rows = [{"category": str(self.category.pk), "title": "Beans", "description": "Dry beans",
+                 "county": "Nakuru", "sub_county": "Njoro"}]
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as data_file:
+            json.dump(rows, data_file)
+        self.addCleanup(os.remove, data_file.name)
+        out = StringIO()
+        call_command('import_ads', data_file.name, user="john@example.com", stdout=out)
+        self.assertIn("Created 1 of 1", out.getvalue())
+        self.assertTrue(Advertisement.objects.filter(title="Beans").exists())
+
+
+class PhotoRenditionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=user, category=category, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def image_upload(self, name="mango.png", size=(2000, 1000), mode="RGBA"):
+        output = io.BytesIO()
+        Image.new(mode, size, (200, 120, 0, 128) if mode == "RGBA" else (200, 120, 0)).save(output, "PNG")
+        return SimpleUploadedFile(name, output.getvalue(), content_type="image/png")
+
+    @override_settings(AD_PHOTO_RENDITIONS_ASYNC=False)
+    def test_renditions_generated_after_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = AdvertisementPhoto.objects.create(advert=self.ad, photo=self.image_upload())
+        photo.refresh_from_db()
+        self.assertEqual(set(photo.renditions), {"thumbnail", "medium", "webp"})
+
+        with photo.photo.storage.open(photo.renditions["thumbnail"]) as f, Image.open(f) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ("JPEG", (240, 120)))
+        with photo.photo.storage.open(photo.renditions["webp"]) as f, Image.open(f) as webp:
+            self.assertEqual((webp.format, webp.size), ("WEBP", (1600, 800)))
+
+        self.client.force_authenticate(self.ad.user)
+        response = self.client.get(reverse('ad-detail', args=[self.ad.id]), HTTP_USER_AGENT="Mozilla/5.0")
+        urls = response.data['advertisement_photos'][0]['renditions']
+        self.assertTrue(urls['medium'].startswith("http://testserver/") and urls['medium'].endswith(".jpg"))
+
+    @override_settings(AD_PHOTO_RENDITIONS_ASYNC=False)
+    def test_unreadable_upload_keeps_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile("bad.jpg", b"not an image"))
+        photo.refresh_from_db()
+        self.assertEqual(photo.renditions, {})
+
+    def test_backfill_command(self):
+        for i in range(3):
+            AdvertisementPhoto.objects.create(advert=self.ad, photo=self.image_upload(f"mango{i}.png", (300, 300), "RGB"))
+        out = StringIO()
+        call_command('generate_photo_renditions', stdout=out)
+        self.assertIn("Rendered 3 photos", out.getvalue())
+        self.assertFalse(AdvertisementPhoto.objects.filter(renditions={}).exists())
+
+
+class UploadLimitTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.category = Category.objects.create(name="Fruits", classification="FP")
+        self.client.force_authenticate(self.user)
+
+    def post_ad(self, *photos):
+        data = {
+            "category": self.category.pk, "title": "Mangoes", "description": "Ripe",
+            "county": "Nakuru", "sub_county": "Njoro", "photos": list(photos),
+        }
+        return self.client.post(reverse('new-ad'), data, format='multipart')
+
+    def photo(self, name, size):
+        return SimpleUploadedFile(name, b"x" * size, content_type="image/jpeg")
+
+    @override_settings(UPLOAD_MAX_FILE_SIZE=1024, UPLOAD_MAX_FILES=3)
+    def test_upload_within_limits(self):
+        response = self.post_ad(self.photo("a.jpg", 1000), self.photo("b.jpg", 1024))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(AdvertisementPhoto.objects.count(), 2)
+
+    @override_settings(UPLOAD_MAX_FILE_SIZE=1024)
+    def test_oversize_file_rejected(self):
+        response = self.post_ad(self.photo("a.jpg", 100), self.photo("big.jpg", 4096))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn("big.jpg", response.data['detail'])
+        self.assertFalse(Advertisement.objects.exists())
+
+    @override_settings(UPLOAD_MAX_FILES=2)
+    def test_too_many_files_rejected(self):
+        response = self.post_ad(*[self.photo(f"{i}.jpg", 10) for i in range(3)])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Advertisement.objects.exists())
+
+    @override_settings(UPLOAD_MAX_REQUEST_SIZE=2048)
+    def test_oversize_request_rejected_before_reading_body(self):
+        response = self.post_ad(self.photo("a.jpg", 1500), self.photo("b.jpg", 1500))
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Advertisement.objects.exists())
+
+
+class MailAttachmentNameTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_staff_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.client.force_authenticate(self.admin)
+        self.mail = IndividualMail.objects.create(sender=self.admin, recipient="jane@example.com", subject="Prices", message="Attached")
+        MailViewSet().create_attachments(self.mail, [SimpleUploadedFile("price-list.pdf", b"%PDF prices")])
+
+    def test_detail_shows_uploaded_name(self):
+        response = self.client.get(reverse('mail-detail', args=[self.mail.id]))
+        self.assertEqual([attachment['filename'] for attachment in response.data['attachments']], ["price-list.pdf"])
+
+    def test_sent_under_uploaded_name(self):
+        # Run the mailer's thread inline
+        def inline_thread(target, args, kwargs):
+            return mock.Mock(start=lambda: target(*args, **kwargs))
+
+        with mock.patch('dashboard.utils.mailing.threading.Thread', side_effect=inline_thread):
+            response = self.client.post(reverse('mail-send', args=[self.mail.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mail.outbox[0].attachments, [("price-list.pdf", b"%PDF prices", "application/pdf")])
+
+
+@override_settings(CACHES=NON_DB_CACHES)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.produce = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+
+    def view_queries(self, url, params=None):
+        """Queries run by the view, leaving out the traffic middleware's inserts"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        queries = [q['sql'] for q in view_queries(context)]
+        return queries, response
+
+    def test_warm_list_costs_no_queries(self):
+        for url in [reverse('produce-ads'), reverse('service-ads'), reverse('categories')]:
+            cold, first = self.view_queries(url)
+            warm, second = self.view_queries(url)
+            self.assertTrue(cold)
+            self.assertEqual(warm, [])
+            self.assertEqual(first.data, second.data)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}})
+    def test_database_cache_hits_still_query(self):
+        url = reverse('produce-ads')
+        self.view_queries(url)
+        warm, _ = self.view_queries(url)
+        self.assertTrue(warm)
+        self.assertTrue(all('django_cache' in sql for sql in warm))
+
+    def test_query_params_keyed_separately(self):
+        url = reverse('produce-ads')
+        self.view_queries(url)
+        queries, _ = self.view_queries(url, {'county': 'Nakuru'})
+        self.assertTrue(queries)
+
+    def test_ad_write_invalidates(self):
+        url = reverse('produce-ads')
+        self.client.get(url)
+        self.ad.title = "Sweet mangoes"
+        self.ad.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['title'], "Sweet mangoes")
+
+        AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile("a.jpg", b"photo"))
+        self.assertIsNotNone(self.client.get(url).data['results'][0]['thumbnail'])
+
+    def test_category_write_invalidates(self):
+        url = reverse('categories')
+        self.client.get(url)
+        self.client.get(reverse('produce-ads'))
+        self.produce.name = "Fresh fruits"
+        self.produce.classification = "SL"
+        self.produce.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['name'], "Fresh fruits")
+        self.assertEqual(self.client.get(reverse('produce-ads')).data['results'], [])
+
+
+@override_settings(CACHES=NON_DB_CACHES)
+class ConditionalResponseTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.produce = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+        self.client.force_authenticate(self.user)
+        self.url = reverse('ad-detail', args=[self.ad.id])
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(any('dashboard_advertisementphoto' in q['sql'] and 'IN (' in q['sql'] for q in context.captured_queries))
+
+    def test_not_modified_views_share_the_ad_key(self):
+        etag = self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")['ETag']
+        viewer = CustomUser.objects.create_user(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="0712345679", password="password123"
+        )
+        self.client.force_authenticate(viewer)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, HTTP_USER_AGENT="Mozilla/5.0")
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.assertEqual(ad_views.pending_views(self.ad.id), 2)
+        self.assertEqual(ad_views.flush(), {self.ad.id: 2})
+
+    def test_detail_etag_follows_photos(self):
+        etag = self.client.get(self.url)['ETag']
+        photo = AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile("a.jpg", b"photo"))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        photo.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_detail_missing_ad(self):
+        self.assertEqual(self.client.get(reverse('ad-detail', args=["not-a-uuid"])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_not_modified_until_ads_change(self):
+        url = reverse('produce-ads')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Avocados", description="Hass", county="Nakuru", sub_county="Molo"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+    def test_list_validators_without_counting(self):
+        url = reverse('produce-ads')
+        with CaptureQueriesContext(connection) as context:
+            etag = self.client.get(url)['ETag']
+        cache.clear()
+        with CaptureQueriesContext(connection) as conditional_context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        for query in view_queries(context) + view_queries(conditional_context):
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('MAX(', query['sql'])
+
+    def test_list_etag_follows_edits_on_page(self):
+        url = reverse('produce-ads')
+        etag = self.client.get(url)['ETag']
+        self.ad.title = "Sweet mangoes"
+        self.ad.save()
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES=NON_DB_CACHES)
+class AdFullTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        ad_views.flush()
+        self.seller = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.viewer = CustomUser.objects.create_user(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="0712345679", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.seller, category=category, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+        self.client.force_authenticate(self.viewer)
+        self.url = reverse('ad-full', args=[self.ad.id])
+        featured.rebuild()
+
+    def tearDown(self):
+        ad_views.flush()
+
+    def add_reviews(self, *values):
+        Reviews.objects.bulk_create([Reviews(advertisement=self.ad, message="Good", rating=rating) for rating in values])
+        # bulk_create skips the review view that maintains the aggregates
+        ratings.recompute(Advertisement.objects.filter(pk=self.ad.pk))
+
+    def view_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_USER_AGENT="Mozilla/5.0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        queries = view_queries(context)
+        return len(queries), response
+
+    def test_full_ad(self):
+        AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile("a.jpg", b"photo"))
+        self.add_reviews("5", "4", "4")
+        _, response = self.view_queries()
+
+        self.assertEqual(response.data['title'], "Mangoes")
+        self.assertEqual(len(response.data['advertisement_photos']), 1)
+        self.assertEqual(response.data['seller']['first_name'], "John")
+        self.assertNotIn('email', response.data['seller'])
+        reviews = response.data['reviews']
+        self.assertEqual((reviews['count'], reviews['average_rating']), (3, 4.33))
+        self.assertEqual(reviews['distribution']['4'], 2)
+        self.assertEqual(len(reviews['results']), 3)
+        self.assertIsNone(reviews['next'])
+        self.assertFalse(response.data['is_featured'])
+
+    def test_fixed_query_count(self):
+        self.add_reviews("5")
+        few, _ = self.view_queries()
+        for i in range(3):
+            AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile(f"{i}.jpg", f"photo {i}".encode()))
+        self.add_reviews(*["3"] * 30)
+        many, response = self.view_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['reviews']['results']), 20)
+        self.assertIsNotNone(response.data['reviews']['next'])
+
+
+class FeaturedFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.produce = Category.objects.create(name="Fruits", classification="FP")
+        self.ads = []
+        for i in range(12):
+            ad = Advertisement.objects.create(
+                user=self.user, category=self.produce, title=f"Ad {i}", description="Fresh", county="Nakuru", sub_county="Njoro"
+            )
+            Advertisement.objects.filter(pk=ad.pk).update(created_on=timezone.now() - timedelta(hours=12 - i))
+            self.ads.append(ad)
+
+        package = SubscriptionPackage.objects.create(name="Featured", description="Boost", duration=30, pricing=100)
+        payment = Payment.objects.create(
+            user=self.user, transaction_type="Pay Bill", trans_id="12345", trans_time=timezone.now(), trans_amount=100,
+            msisdn="0712345678", first_name="John", last_name="Doe"
+        )
+        self.subscription = Subscription.objects.create(
+            user=self.user, package=package, payment=payment,
+            start_date=timezone.localdate(), end_date=timezone.localdate() + timedelta(days=30)
+        )
+        self.featured = [self.ads[0], self.ads[1]]
+        for ad in self.featured:
+            FeaturedAdvertisement.objects.create(subscription=self.subscription, advertisement=ad)
+
+    def titles(self, response):
+        return [ad['title'] for ad in response.data['results']]
+
+    def test_featured_ads_interleaved_on_first_page(self):
+        response = self.client.get(reverse('produce-ads'))
+        results = response.data['results']
+        featured_titles = {"Ad 0", "Ad 1"}
+        self.assertIn(results[0]['title'], featured_titles)
+        self.assertIn(results[5]['title'], featured_titles)
+        self.assertTrue(results[0]['is_featured'] and results[5]['is_featured'])
+        self.assertEqual(len(self.titles(response)), len(set(self.titles(response))))
+        self.assertFalse(results[1]['is_featured'])
+
+    @mock.patch.object(RecentAdsPagination, 'page_size', 4)
+    def test_later_pages_not_boosted(self):
+        response = self.client.get(reverse('produce-ads'))
+        # The promoted ads take the places of organic ones, so the page keeps its size
+        titles = self.titles(response)
+        self.assertEqual(len(titles), 4)
+        self.assertEqual({titles[0], titles[3]}, {"Ad 0", "Ad 1"})
+        self.assertEqual(titles[1:3], ["Ad 11", "Ad 10"])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.titles(response), ["Ad 9", "Ad 8", "Ad 7", "Ad 6"])
+
+    @mock.patch.object(RecentAdsPagination, 'page_size', 4)
+    def test_every_ad_shown_once(self):
+        titles, url = [], reverse('produce-ads')
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 4)
+            titles += self.titles(response)
+            url = response.data['next']
+        self.assertEqual(sorted(titles), sorted(ad.title for ad in self.ads))
+
+    def test_expired_subscription_drops_featured(self):
+        self.client.get(reverse('produce-ads'))
+        Subscription.objects.filter(pk=self.subscription.pk).update(end_date=timezone.localdate() - timedelta(days=1))
+        call_command('expire_subscriptions', stdout=StringIO())
+        response = self.client.get(reverse('produce-ads'))
+        self.assertEqual(self.titles(response)[:2], ["Ad 11", "Ad 10"])
+        self.assertFalse(any(ad['is_featured'] for ad in response.data['results']))
+
+    def test_other_classification_unaffected(self):
+        response = self.client.get(reverse('service-ads'))
+        self.assertEqual(response.data['results'], [])
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        produce = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=user, category=produce, title="Mangoes", description="Ripe " * 200, county="Nakuru", sub_county="Njoro"
+        )
+        self.photo = AdvertisementPhoto.objects.create(advert=self.ad, photo=SimpleUploadedFile("a.jpg", b"photo"))
+        self.url = reverse('produce-ads')
+
+    def test_compact_card_by_default(self):
+        card = self.client.get(self.url).data['results'][0]
+        self.assertEqual(card['location'], "Njoro, Nakuru")
+        self.assertTrue(card['thumbnail'].endswith(self.photo.photo.url))
+        self.assertNotIn('description', card)
+        self.assertNotIn('advertisement_photos', card)
+
+    def test_thumbnail_prefers_rendition(self):
+        AdvertisementPhoto.objects.filter(pk=self.photo.pk).update(renditions={"thumbnail": "ad-images/renditions/a.jpg"})
+        card = self.client.get(self.url).data['results'][0]
+        self.assertTrue(card['thumbnail'].endswith("ad-images/renditions/a.jpg"))
+
+    def test_expand(self):
+        card = self.client.get(self.url, {'expand': 'description,advertisement_photos'}).data['results'][0]
+        self.assertTrue(card['description'].startswith("Ripe"))
+        self.assertEqual(len(card['advertisement_photos']), 1)
+
+    def test_fields(self):
+        card = self.client.get(self.url, {'fields': 'title,description'}).data['results'][0]
+        self.assertEqual(set(card), {'id', 'title', 'description', 'is_featured'})
+
+    def test_search_uses_cards(self):
+        card = self.client.get(reverse('search-ads'), {'q': 'mangoes', 'fields': 'title'}).data['results'][0]
+        self.assertEqual(set(card), {'id', 'title'})
+
+
+class DuplicateAdTests(APITestCase):
+    description = "Fresh ripe mangoes from Njoro farm, sold per crate. Call for delivery within Nakuru."
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.produce = Category.objects.create(name="Fruits", classification="FP")
+        self.original = Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Mangoes", description=self.description,
+            county="Nakuru", sub_county="Njoro"
+        )
+        Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Ploughing", description="Tractor ploughing for hire in Molo.",
+            county="Nakuru", sub_county="Molo"
+        )
+
+    def test_repost_flagged_at_creation(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('new-ad'), {
+            "category": self.produce.pk, "title": "Mangoes!", "description": self.description + " Sweet.",
+            "county": "Nakuru", "sub_county": "Njoro",
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([match['id'] for match in response.data['possible_duplicates']], [self.original.id])
+
+    def test_edit_updates_fingerprint(self):
+        self.original.description = "Dairy goats, vaccinated and ready for sale."
+        self.original.save()
+        self.assertEqual(duplicates.find_duplicates(Advertisement(title="Mangoes", description=self.description)), [])
+
+    def test_index_command_report(self):
+        copy = Advertisement.objects.create(
+            user=self.user, category=self.produce, title="Mangoes", description=self.description,
+            county="Nakuru", sub_county="Njoro"
+        )
+        AdvertisementFingerprint.objects.all().delete()
+        out = StringIO()
+        call_command('index_ad_duplicates', '--report', stdout=out)
+        self.assertIn("Fingerprinted 3 advertisements", out.getvalue())
+        self.assertIn("1 groups", out.getvalue())
+        self.assertIn(str(copy.pk), out.getvalue())
+
+
+class SimilarAdsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        similar.reset()
+        directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(similar, 'INDEX_PATH', os.path.join(directory, 'similar-ads.idx'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(similar.reset)
+
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        fruits = Category.objects.create(name="Fruits", classification="FP")
+        machinery = Category.objects.create(name="Machinery", classification="SL")
+
+        def ad(category, title, description):
+            return Advertisement.objects.create(
+                user=self.user, category=category, title=title, description=description,
+                county="Nakuru", sub_county="Njoro"
+            )
+
+        self.mangoes = ad(fruits, "Ripe mangoes", "Sweet ripe mangoes sold per crate in Njoro.")
+        self.more_mangoes = ad(fruits, "Apple mangoes", "Apple mangoes, ripe and sweet, per crate.")
+        self.avocados = ad(fruits, "Avocados", "Hass avocados for export.")
+        self.tractor = ad(machinery, "Tractor hire", "Tractor ploughing and harrowing for hire.")
+
+    def similar_ids(self, ad, **params):
+        response = self.client.get(reverse('similar-ads', args=[ad.pk]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [uuid.UUID(item['id']) for item in response.data]
+
+    def test_ranked_from_index(self):
+        call_command('build_similar_ads_index', stdout=StringIO())
+        self.assertEqual(self.similar_ids(self.mangoes, limit=2), [self.more_mangoes.id, self.avocados.id])
+
+    def test_index_roundtrip(self):
+        self.assertEqual(similar.build(), 4)
+        index = similar.get_index()
+        for ad in (self.mangoes, self.avocados, self.tractor):
+            self.assertEqual(index.ad_id(index.row_of(ad.pk)), ad.pk)
+        self.assertIsNone(index.row_of(uuid.uuid4()))
+        (ad_id, score), *_ = index.neighbours(self.mangoes.pk)
+        self.assertEqual(ad_id, self.more_mangoes.pk)
+        self.assertLessEqual(score, 1.0 + 1e-6)
+
+    def test_deleted_ads_skipped(self):
+        similar.build()
+        self.more_mangoes.delete()
+        self.assertNotIn(self.more_mangoes.id, self.similar_ids(self.mangoes))
+
+    def test_same_category_without_index(self):
+        self.assertEqual(self.similar_ids(self.mangoes), [self.avocados.id, self.more_mangoes.id])
+
+    def test_invalid_limit(self):
+        response = self.client.get(reverse('similar-ads', args=[self.mangoes.pk]), {'limit': 500})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_ad(self):
+        for pk in (uuid.uuid4(), 'not-a-uuid'):
+            response = self.client.get(reverse('similar-ads', args=[pk]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AdArchiveTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        featured.invalidate()
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.category = Category.objects.create(name="Fruits", classification="FP")
+        self.stale = Advertisement.objects.create(
+            user=self.user, category=self.category, title="Mangoes", description="Ripe", county="Nakuru",
+            sub_county="Njoro", expires_on=timezone.now() - timedelta(days=1)
+        )
+        self.fresh = Advertisement.objects.create(
+            user=self.user, category=self.category, title="Avocados", description="Hass", county="Nakuru",
+            sub_county="Njoro"
+        )
+        output = io.BytesIO()
+        Image.new("RGB", (10, 10), (200, 120, 0)).save(output, "PNG")
+        self.photo = AdvertisementPhoto.objects.create(
+            advert=self.stale, photo=SimpleUploadedFile("mango.png", output.getvalue(), content_type="image/png")
+        )
+        self.review = Reviews.objects.create(advertisement=self.stale, message="Sweet", rating="5")
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for photo in ArchivedAdvertisementPhoto.objects.all():
+            photo.delete()
+
+    def subscribe(self, start_date, end_date):
+        package = SubscriptionPackage.objects.create(name="Gold", description="Featured", pricing=100)
+        payment = Payment.objects.create(
+            user=self.user, transaction_type="Pay Bill", trans_id="12345", trans_time=timezone.now(), trans_amount=100,
+            msisdn="0712345678", first_name="John", last_name="Doe"
+        )
+        return Subscription.objects.create(
+            user=self.user, package=package, payment=payment, start_date=start_date, end_date=end_date
+        )
+
+    def expired_ads(self, count, photos):
+        ads = []
+        for i in range(count):
+            ad = Advertisement.objects.create(
+                user=self.user, category=self.category, title=f"Ad {i}", description="Old", county="Nakuru",
+                sub_county="Njoro", expires_on=timezone.now() - timedelta(days=1)
+            )
+            for j in range(photos):
+                AdvertisementPhoto.objects.create(advert=ad, photo=SimpleUploadedFile(f"{i}-{j}.jpg", f"{i}-{j}".encode()))
+            ads.append(ad.pk)
+        return ads
+
+    def test_new_ads_get_an_expiry(self):
+        self.assertGreater(self.fresh.expires_on, timezone.now() + timedelta(days=89))
+
+    def test_command_moves_expired_ads_and_photos(self):
+        out = StringIO()
+        call_command('archive_ads', '--batch-size', '1', stdout=out)
+        self.assertIn("Archived 1 advertisements", out.getvalue())
+
+        self.assertFalse(Advertisement.objects.filter(pk=self.stale.pk).exists())
+        self.assertTrue(Advertisement.objects.filter(pk=self.fresh.pk).exists())
+        archived = ArchivedAdvertisement.objects.get(pk=self.stale.pk)
+        self.assertEqual(archived.reviews, [{"message": "Sweet", "rating": 5, "created_on": self.review.created_on.isoformat()}])
+        archived_photo = archived.advertisement_photos.get()
+        self.assertEqual((archived_photo.pk, archived_photo.photo.name), (self.photo.pk, self.photo.photo.name))
+        self.assertTrue(archived_photo.photo.storage.exists(archived_photo.photo.name))
+
+    def test_featured_ads_are_kept(self):
+        subscription = self.subscribe(timezone.localdate(), timezone.localdate() + timedelta(days=30))
+        FeaturedAdvertisement.objects.create(subscription=subscription, advertisement=self.stale)
+        call_command('archive_ads', stdout=StringIO())
+        self.assertTrue(Advertisement.objects.filter(pk=self.stale.pk).exists())
+
+    def test_featured_history_is_archived(self):
+        start, end = timezone.localdate() - timedelta(days=60), timezone.localdate() - timedelta(days=30)
+        subscription = self.subscribe(start, end)
+        FeaturedAdvertisement.objects.create(subscription=subscription, advertisement=self.stale)
+        call_command('archive_ads', stdout=StringIO())
+
+        self.assertFalse(FeaturedAdvertisement.objects.exists())
+        self.assertEqual(
+            ArchivedAdvertisement.objects.get(pk=self.stale.pk).featured,
+            [{"subscription": str(subscription.pk), "start_date": start.isoformat(), "end_date": end.isoformat()}]
+        )
+
+    @override_settings(CACHES=NON_DB_CACHES)
+    def test_batch_costs_fixed_queries(self):
+        def archive_queries(ids):
+            with mock.patch.object(response_cache, 'bump', wraps=response_cache.bump) as bump:
+                with CaptureQueriesContext(connection) as context:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        self.assertEqual(archive.archive(ids), len(ids))
+            bump.assert_called_once_with(response_cache.ADVERTISEMENTS)
+            return len(view_queries(context))
+
+        self.assertEqual(archive_queries(self.expired_ads(1, 1)), archive_queries(self.expired_ads(4, 3)))
+
+    def test_archived_ads_leave_the_search_index(self):
+        call_command('archive_ads', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT ad_id FROM {search.FTS_TABLE}")
+            indexed = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(indexed, {self.fresh.pk.hex})
+
+    def test_detail_falls_back_to_archive(self):
+        call_command('archive_ads', stdout=StringIO())
+        response = self.client.get(reverse('ad-detail', args=[self.stale.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['title'], "Mangoes")
+        self.assertEqual(len(response.data['advertisement_photos']), 1)
+
+        response = self.client.get(reverse('ad-detail', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RatingAggregateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        featured.rebuild()
+        self.seller = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        self.buyer = CustomUser.objects.create_user(
+            first_name="Jane", last_name="Doe", email="jane@example.com", phone="0712345679", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.seller, category=category, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+        self.client.force_authenticate(self.buyer)
+
+    def review(self, rating):
+        response = self.client.post(reverse('new-review'), {"advertisement": self.ad.pk, "message": "Good", "rating": rating})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_review_updates_aggregates(self):
+        self.assertEqual(self.review("5").data['rating'], 5)
+        self.review(4)
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.rating_count, self.ad.rating_sum, self.ad.rating_average), (2, 9, 4.5))
+        self.assertEqual(self.ad.rating_histogram, {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1})
+
+    def test_invalid_rating_rejected(self):
+        response = self.client.post(reverse('new-review'), {"advertisement": self.ad.pk, "rating": 6})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.rating_count, 0)
+
+    def test_cards_show_ratings(self):
+        self.review(3)
+        response = self.client.get(reverse('produce-ads'), {'expand': 'rating_histogram'})
+        card = response.data['results'][0]
+        self.assertEqual((card['rating_count'], card['rating_average']), (1, 3.0))
+        self.assertEqual(card['rating_histogram']['3'], 1)
+
+    def test_recompute_fixes_drift(self):
+        self.review(5)
+        Reviews.objects.create(advertisement=self.ad, message="Bad", rating=1)
+        Advertisement.objects.filter(pk=self.ad.pk).update(rating_5_count=7)
+        out = StringIO()
+        call_command('recompute_ad_ratings', stdout=out)
+        self.assertIn("on 1 advertisements", out.getvalue())
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.rating_count, self.ad.rating_sum), (2, 6))
+        self.assertEqual((self.ad.rating_1_count, self.ad.rating_5_count), (1, 1))
+
+    def test_seller_reputation_follows_reviews(self):
+        self.review(5)
+        self.review(2)
+        self.seller.refresh_from_db()
+        self.assertEqual((self.seller.review_count, self.seller.rating_average), (2, 3.5))
+
+        response = self.client.get(reverse('ad-full', args=[self.ad.pk]))
+        self.assertEqual((response.data['seller']['review_count'], response.data['seller']['rating_average']), (2, 3.5))
+
+    def test_ownership_change_moves_reputation(self):
+        self.review(4)
+        ad = Advertisement.objects.get(pk=self.ad.pk)
+        ad.user = self.buyer
+        ad.save()
+        self.seller.refresh_from_db()
+        self.buyer.refresh_from_db()
+        self.assertEqual((self.seller.review_count, self.seller.rating_sum), (0, 0))
+        self.assertEqual((self.buyer.review_count, self.buyer.rating_sum), (1, 4))
+
+    def test_archived_ads_keep_counting(self):
+        self.review(4)
+        Advertisement.objects.filter(pk=self.ad.pk).update(expires_on=timezone.now() - timedelta(days=1))
+        call_command('archive_ads', stdout=StringIO())
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.review_count, 1)
+        self.assertEqual(ArchivedAdvertisement.objects.get(pk=self.ad.pk).rating_sum, 4)
+
+        call_command('recompute_ad_ratings', stdout=StringIO())
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.review_count, 1)
+
+    def test_deleted_ads_stop_counting(self):
+        self.review(4)
+        Advertisement.objects.get(pk=self.ad.pk).delete()
+        self.seller.refresh_from_db()
+        self.assertEqual((self.seller.review_count, self.seller.rating_sum), (0, 0))
+
+
+class ReviewListTests(APITestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        category = Category.objects.create(name="Fruits", classification="FP")
+        self.ad = Advertisement.objects.create(
+            user=self.seller, category=category, title="Mangoes", description="Ripe", county="Nakuru", sub_county="Njoro"
+        )
+        self.reviews = []
+        for i in range(25):
+            review = Reviews.objects.create(advertisement=self.ad, message=f"Review {i}", rating=5 if i % 5 else 1)
+            # Several reviews share a timestamp, so the id has to break ties
+            Reviews.objects.filter(pk=review.pk).update(created_on=timezone.now() - timedelta(hours=25 - i // 2))
+            self.reviews.append(review)
+        ratings.recompute(Advertisement.objects.filter(pk=self.ad.pk))
+        self.client.force_authenticate(self.seller)
+        self.url = reverse('review-list', args=[self.ad.pk])
+
+    def collect(self, url, **params):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [review['id'] for review in response.data['results']]
+            url, params = response.data['next'], {}
+        return ids
+
+    def test_cursor_pages_cover_every_review_newest_first(self):
+        self.assertEqual(self.collect(self.url), [review.pk for review in reversed(self.reviews)])
+
+    def test_rating_filter(self):
+        ids = self.collect(self.url, rating=1)
+        self.assertEqual(ids, [review.pk for review in reversed(self.reviews) if review.rating == 1])
+
+    def test_invalid_rating(self):
+        response = self.client.get(self.url, {'rating': 'five'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_full_ad_links_to_second_page(self):
+        response = self.client.get(reverse('ad-full', args=[self.ad.pk]))
+        first = [review['id'] for review in response.data['reviews']['results']]
+        rest = self.collect(response.data['reviews']['next'])
+        self.assertEqual(first + rest, [review.pk for review in reversed(self.reviews)])
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.token_cache.clear()
+        self.addCleanup(authentication.token_cache.clear)
+        self.user = CustomUser.objects.create_user(
+            first_name="John", last_name="Doe", email="john@example.com", phone="0712345678", password="password123"
+        )
+        _, self.token = AuthToken.objects.create(self.user)
+        self.credentials = {"HTTP_AUTHORIZATION": f"Token {self.token}"}
+
+    def token_queries(self, url=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url or reverse('user-ads'), **self.credentials)
+        return response, [q for q in context.captured_queries if 'knox_authtoken' in q['sql']]
+
+    def test_repeat_requests_skip_token_lookup(self):
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(queries)
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_logout_evicts_token(self):
+        self.token_queries()
+        response = self.client.post(reverse('logout'), **self.credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response, _ = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_all_evicts_every_token(self):
+        _, other = AuthToken.objects.create(self.user)
+        self.token_queries()
+        self.client.get(reverse('user-ads'), HTTP_AUTHORIZATION=f"Token {other}")
+        self.client.post(reverse('logout-all'), **self.credentials)
+        response = self.client.get(reverse('user-ads'), HTTP_AUTHORIZATION=f"Token {other}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_in_another_worker(self):
+        self.token_queries()
+        # Another worker deactivated the user: it reaches this process only through the cache backend's storage
+        other_worker_cache = caches.create_connection('default')
+        other_worker_cache.set(
+            response_cache.version_key(authentication.user_resource(self.user.pk)), 0, timeout=None
+        )
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        response, _ = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_configured_cache_is_shared_between_workers(self):
+        self.assertTrue(authentication.revocation_is_shared())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_no_caching_without_shared_cache(self):
+        self.token_queries()
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(queries)
+
+    def test_cache_is_bounded(self):
+        tokens = authentication.TokenCache(max_size=2, ttl=60)
+        auth_token = AuthToken.objects.get(user=self.user)
+        for digest in ("a", "b", "c"):
+            tokens.set(digest, self.user, auth_token, 1)
+        self.assertIsNone(tokens.get("a"))
+        self.assertIsNotNone(tokens.get("c"))